@@ -6,6 +6,7 @@ Requires .env file with SUPABASE credentials
 
 import os
 import sys
+from collections import defaultdict
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
@@ -20,6 +21,138 @@ except ImportError:
     print("Make sure you're running from the frontdesk directory")
     sys.exit(1)
 
+# Optional: pandas vectorizes the fallback aggregation (C-level groupby
+# instead of per-row dict updates). The script still works without it.
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+# Optional: numba JIT-compiles the inner grouped fold for ledgers that
+# have grown to millions of rows, where even a C-level groupby setup
+# cost is dwarfed by the per-row loop.
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:
+    np = None
+    njit = None
+
+if njit is not None:
+
+    @njit(cache=True)
+    def _group_fold(idx, qty, cost, n_groups):
+        q = np.zeros(n_groups)
+        c = np.zeros(n_groups)
+        n = np.zeros(n_groups, np.int64)
+        for i in range(idx.shape[0]):
+            g = idx[i]
+            q[g] += qty[i]
+            c[g] += cost[i]
+            n[g] += 1
+        return q, c, n
+
+
+def fetch_aggregated_usage(supabase, days):
+    """
+    Aggregate the usage_ledger server-side via the analyze_usage RPC
+    (see schema.sql). Postgres does the GROUP BY and we only transfer
+    one row per metric type instead of the entire ledger window.
+    Returns None if the RPC is unavailable so callers can fall back.
+    """
+    try:
+        response = supabase.rpc("analyze_usage", {"days": days}).execute()
+    except Exception as e:
+        print(f"⚠️  analyze_usage RPC unavailable ({e}), falling back to row scan")
+        return None
+
+    return {
+        row["metric_type"]: {
+            "quantity": row["total_qty"],
+            "cost": row["total_cost"] or 0,
+            "count": row["n"],
+        }
+        for row in response.data or []
+    }
+
+
+PAGE_SIZE = 1000
+
+
+def iter_usage_rows(supabase, days):
+    """
+    Fallback: stream raw ledger rows for the window in keyset-paginated
+    pages. A single un-paginated select is capped at 1000 rows by
+    PostgREST (silently truncating the window) and holds the whole
+    result in memory; paging on created_at bounds memory to one page.
+    """
+    cutoff_date = (datetime.utcnow() - timedelta(days=days)).isoformat()
+    last_seen = None
+
+    while True:
+        query = supabase.table("usage_ledger").select("*")
+        if last_seen is None:
+            query = query.gte("created_at", cutoff_date)
+        else:
+            query = query.gt("created_at", last_seen)
+
+        response = query.order("created_at").limit(PAGE_SIZE).execute()
+        rows = response.data or []
+        if not rows:
+            return
+
+        yield rows
+
+        if len(rows) < PAGE_SIZE:
+            return
+        last_seen = rows[-1]["created_at"]
+
+
+def fold_usage_page(by_metric, page):
+    """
+    Fold one page of raw ledger rows into the running aggregate, a
+    defaultdict of [quantity, cost, count] triples — one hash lookup per
+    row instead of four dict operations. Prefers a numba-compiled
+    columnar fold, then a pandas groupby (C-level reduce kernels), and
+    finally aggregates row-by-row in the interpreter.
+    """
+    if njit is not None:
+        idx_labels, idx = np.unique(
+            np.array([row.get("metric_type") or "unknown" for row in page]),
+            return_inverse=True,
+        )
+        qty = np.array([row.get("quantity", 0) or 0 for row in page], dtype=np.float64)
+        cost = np.array([row.get("cost_usd", 0) or 0 for row in page], dtype=np.float64)
+        q, c, n = _group_fold(idx, qty, cost, len(idx_labels))
+        for g, metric in enumerate(idx_labels):
+            stats = by_metric[metric]
+            stats[0] += q[g]
+            stats[1] += c[g]
+            stats[2] += int(n[g])
+        return
+
+    if pd is not None:
+        df = pd.DataFrame(page)
+        df["metric_type"] = df["metric_type"].fillna("unknown")
+        df["cost_usd"] = df["cost_usd"].fillna(0)
+        agg = df.groupby("metric_type").agg(
+            quantity=("quantity", "sum"),
+            cost=("cost_usd", "sum"),
+            count=("metric_type", "size"),
+        )
+        for metric, row in agg.iterrows():
+            stats = by_metric[metric]
+            stats[0] += row["quantity"]
+            stats[1] += row["cost"]
+            stats[2] += int(row["count"])
+        return
+
+    for row in page:
+        stats = by_metric[row.get("metric_type", "unknown")]
+        stats[0] += row.get("quantity", 0)
+        stats[1] += row.get("cost_usd", 0) or 0
+        stats[2] += 1
+
 
 def analyze_usage_ledger(days=30):
     """Analyze actual costs from the database"""
@@ -31,19 +164,20 @@ def analyze_usage_ledger(days=30):
         return
 
     try:
-        cutoff_date = (datetime.utcnow() - timedelta(days=days)).isoformat()
-
-        # Fetch usage data
-        response = (
-            supabase.table("usage_ledger")
-            .select("*")
-            .gte("created_at", cutoff_date)
-            .execute()
-        )
+        # Preferred path: server-side GROUP BY, O(metric types) transfer
+        by_metric = fetch_aggregated_usage(supabase, days)
 
-        data = response.data or []
+        if by_metric is None:
+            # Fallback path: fold each page into the aggregate, then discard it
+            folded = defaultdict(lambda: [0.0, 0.0, 0])
+            for page in iter_usage_rows(supabase, days):
+                fold_usage_page(folded, page)
+            by_metric = {
+                metric: {"quantity": stats[0], "cost": stats[1], "count": stats[2]}
+                for metric, stats in folded.items()
+            }
 
-        if not data:
+        if not by_metric:
             print(f"\n⚠️  No usage data found in last {days} days")
             print("\nYou have 3 options:")
             print("1. Make some test calls to generate data")
@@ -51,34 +185,35 @@ def analyze_usage_ledger(days=30):
             print("3. Check your API provider bills directly")
             return
 
+        total_cost = sum(stats["cost"] for stats in by_metric.values())
+
         print(f"\n{'=' * 80}")
         print(f"ACTUAL USAGE ANALYSIS (Last {days} days)")
         print(f"{'=' * 80}\n")
 
-        # Aggregate by metric type
-        by_metric = {}
-        total_cost = 0
-
-        for row in data:
-            metric = row.get("metric_type", "unknown")
-            qty = row.get("quantity", 0)
-            cost = row.get("cost_usd", 0) or 0
-
-            if metric not in by_metric:
-                by_metric[metric] = {"quantity": 0, "cost": 0, "count": 0}
-
-            by_metric[metric]["quantity"] += qty
-            by_metric[metric]["cost"] += cost
-            by_metric[metric]["count"] += 1
-            total_cost += cost
-
         # Display breakdown
         print("Cost Breakdown by Service:")
         print("-" * 80)
 
-        for metric, stats in sorted(by_metric.items(), key=lambda x: x[1]["cost"], reverse=True):
-            pct = (stats["cost"] / total_cost * 100) if total_cost > 0 else 0
-            print(f"{metric:20s} ${stats['cost']:8.2f} ({pct:5.1f}%)  |  {stats['quantity']:,} units  |  {stats['count']:,} calls")
+        # Sort once (C-level key extraction), pick the row format before
+        # the loop so the zero-total case isn't re-branched per row, and
+        # emit a single print: one stdout flush instead of one per metric
+        ordered = sorted(
+            by_metric.items(), key=lambda item: item[1]["cost"], reverse=True
+        )
+        if total_cost > 0:
+            print("\n".join(
+                f"{metric:20s} ${stats['cost']:8.2f} "
+                f"({stats['cost'] / total_cost * 100:5.1f}%)  |  "
+                f"{stats['quantity']:,} units  |  {stats['count']:,} calls"
+                for metric, stats in ordered
+            ))
+        else:
+            print("\n".join(
+                f"{metric:20s} ${stats['cost']:8.2f}  |  "
+                f"{stats['quantity']:,} units  |  {stats['count']:,} calls"
+                for metric, stats in ordered
+            ))
 
         print("-" * 80)
         print(f"{'TOTAL':20s} ${total_cost:8.2f}\n")
@@ -4,6 +4,12 @@ Cost Calculator for FrontDesk AI Voice Agents
 Estimates cost per minute based on service pricing
 """
 
+# Optional: numpy collapses the stack comparison into one broadcast pass
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 # Current pricing as of 2024 (check latest pricing on provider websites)
 PRICING = {
     # Twilio Voice
@@ -73,78 +79,127 @@ def calculate_cost_per_minute(
     }
 
 
-def compare_stacks():
-    """Compare different technology stack costs"""
+# Named stacks compared in the report below
+STACKS = {
+    "GPT-4o-mini + ElevenLabs": {
+        "telephony": "twilio_inbound",
+        "llm": "openai_gpt4o_mini",
+        "stt": "deepgram_nova2",
+        "tts": "elevenlabs_turbo"
+    },
+    "GPT-4o-mini + Cartesia (Recommended)": {
+        "telephony": "twilio_inbound",
+        "llm": "openai_gpt4o_mini",
+        "stt": "deepgram_nova2",
+        "tts": "cartesia"
+    },
+    "GPT-4o-mini + OpenAI TTS": {
+        "telephony": "twilio_inbound",
+        "llm": "openai_gpt4o_mini",
+        "stt": "deepgram_nova2",
+        "tts": "openai_tts"
+    },
+    "Claude Haiku + Cartesia": {
+        "telephony": "twilio_inbound",
+        "llm": "claude_haiku",
+        "stt": "deepgram_nova2",
+        "tts": "cartesia"
+    }
+}
+
+# Margins quoted throughout the report: price = cost / divisor
+MARGIN_DIVISORS = (0.6, 0.5, 0.4)
 
-    stacks = {
-        "GPT-4o-mini + ElevenLabs": {
-            "telephony": "twilio_inbound",
-            "llm": "openai_gpt4o_mini",
-            "stt": "deepgram_nova2",
-            "tts": "elevenlabs_turbo"
-        },
-        "GPT-4o-mini + Cartesia (Recommended)": {
-            "telephony": "twilio_inbound",
-            "llm": "openai_gpt4o_mini",
-            "stt": "deepgram_nova2",
-            "tts": "cartesia"
-        },
-        "GPT-4o-mini + OpenAI TTS": {
-            "telephony": "twilio_inbound",
-            "llm": "openai_gpt4o_mini",
-            "stt": "deepgram_nova2",
-            "tts": "openai_tts"
-        },
-        "Claude Haiku + Cartesia": {
-            "telephony": "twilio_inbound",
-            "llm": "claude_haiku",
-            "stt": "deepgram_nova2",
-            "tts": "cartesia"
+
+def _component_cost_row(config):
+    """Unit costs per minute for one stack as (telephony, stt, llm, tts)."""
+    chars_per_min = TYPICAL_USAGE["words_per_minute"] * TYPICAL_USAGE["characters_per_word"]
+    return (
+        PRICING[config["telephony"]],
+        PRICING[config["stt"]],
+        (TYPICAL_USAGE["input_tokens_per_min"] / 1_000_000) * PRICING[config["llm"]]["input"]
+        + (TYPICAL_USAGE["output_tokens_per_min"] / 1_000_000) * PRICING[config["llm"]]["output"],
+        (chars_per_min / 1_000) * PRICING[config["tts"]],
+    )
+
+
+def _build_stack_tables():
+    """
+    Fold the PRICING/TYPICAL_USAGE lookups once at import time so the
+    report functions just read precomputed numbers per stack. With numpy
+    this is one (nstacks, 4) broadcast: row-sum for totals, an outer
+    division for the 40/50/60% margin prices.
+    """
+    if np is not None:
+        components = np.array([_component_cost_row(c) for c in STACKS.values()])
+        totals = components.sum(axis=1).round(4)
+        components = components.round(4)
+        prices = totals[:, None] / np.array(MARGIN_DIVISORS)
+        costs = {
+            name: {
+                "telephony": row[0],
+                "stt": row[1],
+                "llm": row[2],
+                "tts": row[3],
+                "total": total,
+            }
+            for name, row, total in zip(STACKS, components, totals)
         }
+        margins = dict(zip(STACKS, prices))
+        return costs, margins
+
+    costs = {name: calculate_cost_per_minute(**config) for name, config in STACKS.items()}
+    margins = {
+        name: [c["total"] / d for d in MARGIN_DIVISORS] for name, c in costs.items()
     }
+    return costs, margins
+
+
+STACK_COSTS, STACK_MARGIN_PRICES = _build_stack_tables()
+
+
+def compare_stacks():
+    """Compare different technology stack costs"""
 
     print("=" * 80)
     print("FRONTDESK AI - COST PER MINUTE COMPARISON")
     print("=" * 80)
     print()
 
-    results = {}
-    for name, config in stacks.items():
-        costs = calculate_cost_per_minute(**config)
-        results[name] = costs
-
-        print(f"\n{name}")
-        print("-" * 40)
-        print(f"  Telephony:  ${costs['telephony']:.4f}")
-        print(f"  STT:        ${costs['stt']:.4f}")
-        print(f"  LLM:        ${costs['llm']:.4f}")
-        print(f"  TTS:        ${costs['tts']:.4f}")
-        print(f"  {'─' * 38}")
-        print(f"  TOTAL:      ${costs['total']:.4f}/min")
-        print()
+    results = STACK_COSTS
+    # Assemble each section as one string and print once per stack
+    # rather than flushing stdout line by line
+    print("\n".join(
+        f"\n{name}\n"
+        + "-" * 40 + "\n"
+        f"  Telephony:  ${costs['telephony']:.4f}\n"
+        f"  STT:        ${costs['stt']:.4f}\n"
+        f"  LLM:        ${costs['llm']:.4f}\n"
+        f"  TTS:        ${costs['tts']:.4f}\n"
+        f"  {'─' * 38}\n"
+        f"  TOTAL:      ${costs['total']:.4f}/min\n"
+        for name, costs in results.items()
+    ))
 
     print("=" * 80)
     print("PRICING RECOMMENDATIONS")
     print("=" * 80)
 
-    for name, costs in results.items():
-        cost = costs['total']
-        # Calculate pricing at different margins
-        print(f"\n{name} (${cost:.4f}/min cost):")
-        print(f"  40% margin: ${cost / 0.6:.4f}/min (charge ${cost / 0.6:.2f} per min)")
-        print(f"  50% margin: ${cost / 0.5:.4f}/min (charge ${cost / 0.5:.2f} per min)")
-        print(f"  60% margin: ${cost / 0.4:.4f}/min (charge ${cost / 0.4:.2f} per min)")
+    print("\n".join(
+        f"\n{name} (${costs['total']:.4f}/min cost):\n"
+        f"  40% margin: ${p40:.4f}/min (charge ${p40:.2f} per min)\n"
+        f"  50% margin: ${p50:.4f}/min (charge ${p50:.2f} per min)\n"
+        f"  60% margin: ${p60:.4f}/min (charge ${p60:.2f} per min)"
+        for (name, costs), (p40, p50, p60) in zip(
+            results.items(), STACK_MARGIN_PRICES.values()
+        )
+    ))
 
 
 def calculate_tier_pricing():
     """Calculate subscription tier pricing"""
 
-    optimized_cost_per_min = calculate_cost_per_minute(
-        telephony="twilio_inbound",
-        llm="openai_gpt4o_mini",
-        stt="deepgram_nova2",
-        tts="cartesia"
-    )["total"]
+    optimized_cost_per_min = STACK_COSTS["GPT-4o-mini + Cartesia (Recommended)"]["total"]
 
     print("\n" + "=" * 80)
     print("SUBSCRIPTION TIER CALCULATOR (50% Target Margin)")
@@ -1,7 +1,14 @@
 import os
 import asyncio
+import functools
+import hashlib
+import re
+import time
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
 import argparse
+from contextlib import asynccontextmanager
 import signal
 import urllib.parse
 from dotenv import load_dotenv
@@ -19,6 +26,7 @@ from fastapi import (
     Depends,
     Header,
 )
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from gotrue.errors import AuthApiError
 from starlette.websockets import WebSocketState
@@ -29,11 +37,14 @@ import tiktoken
 import stripe
 
 from pydantic import BaseModel
+from pydantic import ConfigDict
 from pydantic import EmailStr
 
 from pipecat.pipeline.pipeline import Pipeline
 from pipecat.pipeline.runner import PipelineRunner
 from pipecat.pipeline.task import PipelineParams, PipelineTask
+from pipecat.adapters.schemas.direct_function import DirectFunctionWrapper
+from pipecat.adapters.schemas.tools_schema import ToolsSchema
 from pipecat.processors.aggregators.llm_context import LLMContext
 from pipecat.frames.frames import (
     TextFrame,
@@ -44,6 +55,7 @@ from pipecat.frames.frames import (
     TranscriptionFrame,
 )
 from pipecat.serializers.base_serializer import FrameSerializer
+import pipecat.serializers.twilio as pipecat_twilio_serializer
 from pipecat.serializers.twilio import TwilioFrameSerializer
 from pipecat.services.deepgram.stt import DeepgramSTTService
 from pipecat.services.elevenlabs.tts import ElevenLabsTTSService
@@ -53,13 +65,12 @@ from pipecat.transports.websocket.fastapi import (
     FastAPIWebsocketParams,
     FastAPIWebsocketTransport,
 )
-from pipecat.processors.aggregators.llm_response_universal import (
-    LLMContextAggregatorPair,
-)
 from pipecat.runner.utils import parse_telephony_websocket
 
 # Import database functions
 from services.supabase_client import (
+    close_rest_client,
+    finalize_call_record,
     get_supabase_client,
     get_or_create_contact,
     get_client_config,
@@ -127,6 +138,8 @@ from services.llm_tools import (
 from services.google_calendar import get_upcoming_appointments
 
 # Import Response Filter
+from services import call_context
+from services.context_trimmer import ContextTrimmingUserAggregator
 from services.response_filter import ToolStrippingAssistantAggregator
 
 # Import Template Manager
@@ -136,31 +149,77 @@ from services.template_manager import TemplateManager
 from services.price_manager import sync_openrouter_prices, get_model_price
 
 from twilio.rest import Client
-from twilio.twiml.voice_response import VoiceResponse, Connect, Stream
+from twilio.twiml.voice_response import VoiceResponse, Dial
+
+# TwilioFrameSerializer round-trips a JSON message for every 20ms media
+# packet (50/s per call) on the event loop. Swap the module's json for
+# orjson when available; dumps decodes to str so Twilio still receives
+# text websocket frames.
+try:
+    import orjson
+
+    class _OrjsonForTwilio:
+        loads = staticmethod(orjson.loads)
+
+        @staticmethod
+        def dumps(obj):
+            return orjson.dumps(obj).decode("utf-8")
+
+    pipecat_twilio_serializer.json = _OrjsonForTwilio
+except ImportError:
+    pass
+
+# Twilio configuration is immutable after startup; bind it once instead
+# of re-reading os.environ on every call
+TWILIO_ACCOUNT_SID = os.environ["TWILIO_ACCOUNT_SID"]
+TWILIO_AUTH_TOKEN = os.environ["TWILIO_AUTH_TOKEN"]
+TWILIO_PHONE_NUMBER = os.environ.get("TWILIO_PHONE_NUMBER")
 
 # Initialize Twilio Client
-twilio_client = Client(
-    os.environ["TWILIO_ACCOUNT_SID"], os.environ["TWILIO_AUTH_TOKEN"]
-)
+twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+
+# Configure logging. Handlers sit behind a QueueHandler so logger calls
+# inside the websocket handlers just enqueue and return; the listener
+# thread absorbs the actual disk/console writes off the event loop.
+_log_queue = queue.Queue(-1)
+
+
+class _PassthroughQueueHandler(QueueHandler):
+    """QueueHandler that enqueues records without pre-formatting them.
 
-# Configure logging
+    The stock prepare() renders the record through this handler's own
+    formatter (the bare stdlib default here) and writes the result back
+    into record.msg, so the listener-side handlers would then format an
+    already-formatted line. The queue is in-process — nothing needs to
+    be pickled — so just merge the args (they may be mutated by the
+    caller after we return) and leave formatting to the sinks.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+_log_formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+_file_log = logging.FileHandler("frontdesk.log")
+_file_log.setFormatter(_log_formatter)
+_console_log = logging.StreamHandler()
+_console_log.setFormatter(_log_formatter)
+# Secondary debug sink for call traces. Listener-only: the old setup
+# attached this handler to both this module's logger and root, so every
+# record from main was written to the file twice (records propagate).
+file_handler = logging.FileHandler('frontdesk_calls.log')
+file_handler.setLevel(logging.DEBUG)
+file_handler.setFormatter(_log_formatter)
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("frontdesk.log"),
-        logging.StreamHandler(),
-    ],
+    handlers=[_PassthroughQueueHandler(_log_queue)],
+)
+_log_listener = QueueListener(
+    _log_queue, _file_log, _console_log, file_handler, respect_handler_level=True
 )
+_log_listener.start()
 logger = logging.getLogger(__name__)
 
-# Add file handler for debugging
-file_handler = logging.FileHandler('frontdesk_calls.log')
-file_handler.setLevel(logging.DEBUG)
-file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-logger.addHandler(file_handler)
-logging.getLogger().addHandler(file_handler)  # Also add to root logger for all modules
-
 # --- Diagnostic ---
 logger.info(f"DIAGNOSTIC: Loaded SUPABASE_URL: {os.environ.get('SUPABASE_URL')}")
 # ------------------
@@ -168,12 +227,173 @@ logger.info(f"DIAGNOSTIC: Loaded SUPABASE_URL: {os.environ.get('SUPABASE_URL')}"
 # --- Global State ---
 active_calls = {}  # call_id -> { client_id, client_name, caller_phone, start_time, owner_user_id }
 transfer_requests = {}  # "client_id:caller_phone" -> { transfer_number, client_id, caller_phone, timestamp }
+transfer_events = {}  # "client_id:caller_phone" -> asyncio.Event set when a transfer is requested
+
+# Per-worker cap on concurrently running call pipelines. Beyond it, new
+# calls wait for a slot instead of degrading every in-flight call's turn
+# latency through CPU and connection contention.
+MAX_CONCURRENT_CALLS = int(os.environ.get("MAX_CONCURRENT_CALLS", "8"))
+CALL_SEMAPHORE = asyncio.Semaphore(MAX_CONCURRENT_CALLS)
+# A queued caller sits with the websocket accepted but hears nothing and
+# has no balance cutoff running yet, so cap the wait and reject instead
+# of holding unbounded dead air.
+CALL_SLOT_TIMEOUT_SECONDS = float(os.environ.get("CALL_SLOT_TIMEOUT_SECONDS", "15"))
+_calls_waiting_for_slot = 0  # surfaced on the admin dashboard for capacity planning
+# --------------------
+
+
+async def _acquire_call_slot():
+    """Take a pipeline slot, logging when the worker is at capacity.
+
+    Returns True once a slot is held, or False if none freed up within
+    CALL_SLOT_TIMEOUT_SECONDS; callers reject the call in that case.
+    """
+    global _calls_waiting_for_slot
+    if CALL_SEMAPHORE.locked():
+        logger.warning(
+            "All %d pipeline slots busy; queuing call until one frees up",
+            MAX_CONCURRENT_CALLS,
+        )
+    _calls_waiting_for_slot += 1
+    try:
+        await asyncio.wait_for(CALL_SEMAPHORE.acquire(), CALL_SLOT_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.error(
+            "No pipeline slot freed within %.0fs; rejecting call",
+            CALL_SLOT_TIMEOUT_SECONDS,
+        )
+        return False
+    finally:
+        _calls_waiting_for_slot -= 1
+    return True
+
+# --- Config Cache ---
+# Client configs change rarely but are fetched on the critical path of
+# every call before the caller hears anything. Cache them with a short
+# TTL; mutation endpoints invalidate below. Cached dicts are shared, so
+# callers must not modify them.
+CLIENT_CONFIG_TTL_SECONDS = 60.0
+_client_config_cache = {}  # client_id -> (expires_at, config)
+_client_phone_cache = {}  # phone_number -> (expires_at, client row)
+# Keyed per JWT, so bound it: tokens rotate and each entry holds a full
+# copy of the client list. Insertion order tracks expiry order (uniform
+# TTL), so evicting from the front drops the stalest entries first.
+CLIENT_LIST_CACHE_MAX_ENTRIES = 512
+_client_list_cache = {}  # user token -> (expires_at, client rows)
+
+
+async def get_client_config_cached(client_id: str):
+    """TTL-cached wrapper around get_client_config for the call path."""
+    now = time.monotonic()
+    hit = _client_config_cache.get(client_id)
+    if hit is not None and hit[0] > now:
+        return hit[1]
+    config = await get_client_config(client_id)
+    if config:
+        _client_config_cache[client_id] = (now + CLIENT_CONFIG_TTL_SECONDS, config)
+    return config
+
+
+async def get_client_by_phone_cached(phone_number: str):
+    """TTL-cached wrapper around get_client_by_phone for the voice webhook."""
+    now = time.monotonic()
+    hit = _client_phone_cache.get(phone_number)
+    if hit is not None and hit[0] > now:
+        return hit[1]
+    client = await get_client_by_phone(phone_number)
+    if client:
+        _client_phone_cache[phone_number] = (now + CLIENT_CONFIG_TTL_SECONDS, client)
+    return client
+
+
+async def get_all_clients_cached(token: str):
+    """TTL-cached wrapper around get_all_clients, keyed per user token."""
+    now = time.monotonic()
+    hit = _client_list_cache.get(token)
+    if hit is not None and hit[0] > now:
+        return hit[1]
+    clients = await get_all_clients(token)
+    if clients is not None:
+        # Re-insert at the back so insertion order stays expiry order
+        _client_list_cache.pop(token, None)
+        if len(_client_list_cache) >= CLIENT_LIST_CACHE_MAX_ENTRIES:
+            for key, (expires_at, _) in list(_client_list_cache.items()):
+                if expires_at <= now:
+                    del _client_list_cache[key]
+            while len(_client_list_cache) >= CLIENT_LIST_CACHE_MAX_ENTRIES:
+                del _client_list_cache[next(iter(_client_list_cache))]
+        _client_list_cache[token] = (now + CLIENT_CONFIG_TTL_SECONDS, clients)
+    return clients
+
+
+def invalidate_client_caches(client_id: Optional[str] = None):
+    """Drop cached config after a client is updated or deleted."""
+    if client_id is None:
+        _client_config_cache.clear()
+    else:
+        _client_config_cache.pop(client_id, None)
+    # Phone mappings and per-user lists may include the mutated client;
+    # drop them all rather than hunting for the affected entries
+    _client_phone_cache.clear()
+    _client_list_cache.clear()
 # --------------------
 
+# Providers only engage prompt caching above a minimum prefix size
+# (~1024 tokens for OpenAI/Anthropic, 4096 for Gemini). Warn once per
+# client when the configured prompt is too short to ever qualify for
+# cached-input pricing.
+PROMPT_CACHE_MIN_TOKENS = 1024
+_short_prompt_warned = set()
+
+# BPE-aware prompt normalization: curly punctuation and runs of
+# whitespace tokenize worse than their plain-ASCII equivalents, and the
+# system prompt is re-sent on every LLM turn of every call. Optimized
+# once per prompt version, keyed on the original's digest.
+_PROMPT_PUNCT_TABLE = str.maketrans({"‘": "'", "’": "'", "“": '"', "”": '"', "–": "-", "—": "-", " ": " "})
+_prompt_opt_cache = {}  # sha1 of original -> optimized prompt
+
+
+def _optimize_prompt_tokens(text):
+    """
+    Normalize a system prompt so it tokenizes tighter: ASCII punctuation,
+    no trailing line whitespace, intra-line whitespace runs collapsed,
+    and at most one blank line between blocks. The rewrite is kept only
+    if it does not encode to more tokens than the original (or the
+    encoder is unavailable, where shorter text is a safe proxy).
+    """
+    key = hashlib.sha1(text.encode()).hexdigest()
+    cached = _prompt_opt_cache.get(key)
+    if cached is not None:
+        return cached
+
+    optimized = text.translate(_PROMPT_PUNCT_TABLE)
+    optimized = re.sub(r"[ \t]+\n", "\n", optimized)
+    optimized = re.sub(r"[ \t]{2,}", " ", optimized)
+    optimized = re.sub(r"\n{3,}", "\n\n", optimized)
+    optimized = optimized.strip()
+
+    if optimized != text:
+        try:
+            enc = _get_token_encoder()
+            if len(enc.encode_ordinary(optimized)) > len(enc.encode_ordinary(text)):
+                optimized = text
+        except Exception:
+            if len(optimized) > len(text):
+                optimized = text
+
+    _prompt_opt_cache[key] = optimized
+    return optimized
+
 
 class RawAudioSerializer(FrameSerializer):
+    # Both methods run per audio packet (~50 Hz per call), so the frame
+    # constructor and constants are prebound and the byte check is an
+    # exact type() comparison — no MRO walk per packet.
     def __init__(self):
         super().__init__()
+        self._make_frame = InputAudioRawFrame
+        self._sample_rate = 16000
+        self._num_channels = 1
 
     async def serialize(self, frame):
         if isinstance(frame, OutputAudioRawFrame):
@@ -181,15 +401,51 @@ class RawAudioSerializer(FrameSerializer):
         return None
 
     async def deserialize(self, data):
-        if isinstance(data, bytes):
-            return InputAudioRawFrame(audio=data, sample_rate=16000, num_channels=1)
+        if type(data) is bytes:
+            return self._make_frame(
+                audio=data,
+                sample_rate=self._sample_rate,
+                num_channels=self._num_channels,
+            )
         # If we get text (e.g. stringified JSON), ignore it or log it
         # The transport might occasionally send text if not configured perfectly,
         # but we only care about raw audio bytes for the STT.
         return None
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Per-worker startup/shutdown. When the server is launched through
+    main() the state is prepared there before serving begins; under
+    multi-worker uvicorn ("main:app" with workers > 1) each worker
+    process builds its own runner, template cache and log writer here.
+    """
+    owns_state = not hasattr(app.state, "runner")
+    log_writer_task = None
+    if owns_state:
+        app.state.runner = PipelineRunner()
+        app.state.template_manager = TemplateManager()
+        app.state.test_mode = False
+        app.state.shutdown_event = asyncio.Event()
+        app.state.finalize_queue = asyncio.Queue()
+        log_writer_task = asyncio.create_task(
+            finalize_log_writer(app.state.finalize_queue)
+        )
+    yield
+    if owns_state:
+        await app.state.finalize_queue.join()
+        log_writer_task.cancel()
+        await asyncio.gather(
+            app.state.runner.cancel(), log_writer_task, return_exceptions=True
+        )
+    await close_rest_client()
+
+
+# orjson serializes API responses (notably long conversation
+# transcripts) several times faster than stdlib json and handles
+# datetimes natively
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -203,47 +459,114 @@ async def get_current_user_token(authorization: str = Header(...)) -> str:
     return credentials
 
 
-def release_twilio_number(phone_number: str) -> bool:
+async def release_twilio_number(phone_number: str, sid: Optional[str] = None) -> bool:
     """
-    Releases a Twilio phone number by finding its SID and deleting it.
+    Releases a Twilio phone number. When the SID is already known the
+    lookup round-trip is skipped. The Twilio SDK is synchronous, so both
+    REST calls run in a worker thread to keep the event loop free.
     """
     if not phone_number:
         return False
 
     try:
-        # 1. Find the SID
-        incoming_numbers = twilio_client.incoming_phone_numbers.list(
-            phone_number=phone_number, limit=1
-        )
-
-        if incoming_numbers:
+        if sid is None:
+            # 1. Find the SID
+            incoming_numbers = await asyncio.to_thread(
+                twilio_client.incoming_phone_numbers.list,
+                phone_number=phone_number,
+                limit=1,
+            )
+            if not incoming_numbers:
+                logger.warning(f"Twilio number not found for release: {phone_number}")
+                return False
             sid = incoming_numbers[0].sid
-            # 2. Delete (Release) the number
-            twilio_client.incoming_phone_numbers(sid).delete()
-            logger.info(f"Released Twilio number: {phone_number} (SID: {sid})")
-            return True
-        else:
-            logger.warning(f"Twilio number not found for release: {phone_number}")
-            return False
+
+        # 2. Delete (Release) the number
+        await asyncio.to_thread(twilio_client.incoming_phone_numbers(sid).delete)
+        logger.info(f"Released Twilio number: {phone_number} (SID: {sid})")
+        return True
 
     except Exception as e:
         logger.error(f"Failed to release Twilio number {phone_number}: {e}")
         return False
 
 
+# AI provider keys, bound once at import like the Twilio credentials.
+# Note the service *instances* built below are deliberately per call:
+# Pipecat frame processors are linked into exactly one pipeline and
+# carry per-call websocket state, so they cannot be cached per client.
+DEEPGRAM_API_KEY = os.environ.get("DEEPGRAM_API_KEY")
+CARTESIA_API_KEY = os.environ.get("CARTESIA_API_KEY")
+ELEVENLABS_API_KEY = os.environ.get("ELEVENLABS_API_KEY")
+OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY")
+
+
+# --- Robust Tool Registration ---
+# Static name -> handler map, built once at import instead of per call
+# Binds per-call context into a tool handler. A closure rather than
+# functools.partial: pipecat's DirectFunctionWrapper runs
+# get_type_hints() on the registered callable, which rejects partial
+# objects, so a real function with copied metadata is required.
+def create_tool_wrapper(func, c_id, c_phone):
+    async def wrapper(params, **kwargs):
+        # Inject context variables into the call
+        return await func(params, client_id=c_id, caller_phone=c_phone, **kwargs)
+
+    # Copy metadata so Pipecat can introspect it
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+TOOL_MAP = {
+    "get_available_slots": handle_get_available_slots,
+    "book_appointment": handle_book_appointment,
+    "save_contact_name": handle_save_contact_name,
+    "reschedule_appointment": handle_reschedule_appointment,
+    "cancel_appointment": handle_cancel_appointment,
+    "list_my_appointments": handle_list_my_appointments,
+    "transfer_call": handle_transfer_call,
+}
+
+# Tool schemas depend only on which tools are enabled, not on the call,
+# so generate them once per enabled-tool combination
+_tools_schema_cache = {}  # tuple(enabled_tools) -> ToolsSchema
+
+
 async def initialize_client_services(
-    client_id: str, caller_phone: Optional[str] = None
+    client_id: str, caller_phone: Optional[str] = None,
+    audio_sample_rate: Optional[int] = None,
+    client_config: Optional[dict] = None,
 ):
     """
     Fetches config and initializes AI services.
     Uses a wrapper function to inject client_id and caller_phone safely.
+
+    audio_sample_rate pins STT input and TTS output to the transport's
+    wire rate (8 kHz for Twilio) so audio is generated and consumed at
+    that rate directly instead of being resampled inside the pipeline.
+    Callers that already hold the config can pass it to skip the fetch.
     """
-    client_config = await get_client_config(client_id)
+    if client_config is None:
+        client_config = await get_client_config_cached(client_id)
     if not client_config:
         logger.error(f"Failed to load config for client_id: {client_id}")
         return None
 
-    system_prompt = client_config.get("system_prompt", "You are an AI receptionist.")
+    system_prompt = _optimize_prompt_tokens(
+        client_config.get("system_prompt", "You are an AI receptionist.")
+    )
+
+    if client_id not in _short_prompt_warned:
+        _short_prompt_warned.add(client_id)
+        # Rough estimate: ~4 chars per token for English prose
+        if len(system_prompt) // 4 < PROMPT_CACHE_MIN_TOKENS:
+            logger.warning(
+                f"System prompt for client {client_id} is ~{len(system_prompt) // 4} tokens, "
+                f"below the ~{PROMPT_CACHE_MIN_TOKENS}-token provider prompt-cache threshold; "
+                "input-token discounts will not apply."
+            )
+
     llm_model = client_config.get("llm_model", "openai/gpt-4o-mini")
     stt_model = client_config.get("stt_model", "nova-2-phonecall")
     tts_provider = client_config.get("tts_provider", "cartesia")  # Default to Cartesia for cost savings
@@ -260,43 +583,42 @@ async def initialize_client_services(
     ]
 
     stt = DeepgramSTTService(
-        api_key=os.environ["DEEPGRAM_API_KEY"],
+        api_key=DEEPGRAM_API_KEY,
         model=stt_model,
         vad_events=True,
+        sample_rate=audio_sample_rate,
     )
 
     # Initialize TTS service based on provider
     if tts_provider == "cartesia":
         logger.info(f"[TTS DEBUG] Initializing Cartesia TTS - Voice: {tts_voice_id}")
-        logger.info(f"[TTS DEBUG] Cartesia API Key present: {bool(os.environ.get('CARTESIA_API_KEY'))}")
+        logger.info(f"[TTS DEBUG] Cartesia API Key present: {bool(CARTESIA_API_KEY)}")
 
         tts = CartesiaTTSService(
-            api_key=os.environ["CARTESIA_API_KEY"],
+            api_key=CARTESIA_API_KEY,
             voice_id=tts_voice_id,
             model="sonic-3",  # Cartesia's default model
+            sample_rate=audio_sample_rate,
         )
 
         logger.info(f"[TTS DEBUG] Cartesia TTS service created successfully")
 
     else:  # elevenlabs
         logger.info(f"[TTS DEBUG] Initializing ElevenLabs TTS - Voice: {tts_voice_id}, Model: {tts_model}")
-        logger.info(f"[TTS DEBUG] ElevenLabs API Key present: {bool(os.environ.get('ELEVENLABS_API_KEY'))}")
+        logger.info(f"[TTS DEBUG] ElevenLabs API Key present: {bool(ELEVENLABS_API_KEY)}")
 
         tts = ElevenLabsTTSService(
-            api_key=os.environ["ELEVENLABS_API_KEY"],
+            api_key=ELEVENLABS_API_KEY,
             voice_id=tts_voice_id,
             model_id=tts_model,
             optimize_streaming_latency=4,
+            sample_rate=audio_sample_rate,
         )
 
         logger.info(f"[TTS DEBUG] ElevenLabs TTS service created successfully")
 
-    class DebugLLM(OpenAILLMService):
-        async def run_llm(self, *args, **kwargs):
-            return await super().run_llm(*args, **kwargs)
-
-    llm = DebugLLM(
-        api_key=os.environ["OPENROUTER_API_KEY"],
+    llm = OpenAILLMService(
+        api_key=OPENROUTER_API_KEY,
         base_url="https://openrouter.ai/api/v1",
         model=llm_model,
         temperature=0.6,
@@ -304,32 +626,10 @@ async def initialize_client_services(
         stream=True,
     )
 
-    # --- Robust Tool Registration ---
-    tool_map = {
-        "get_available_slots": handle_get_available_slots,
-        "book_appointment": handle_book_appointment,
-        "save_contact_name": handle_save_contact_name,
-        "reschedule_appointment": handle_reschedule_appointment,
-        "cancel_appointment": handle_cancel_appointment,
-        "list_my_appointments": handle_list_my_appointments,
-        "transfer_call": handle_transfer_call,
-    }
-
     logger.info(f"Enabling tools for client {client_id}: {enabled_tools}")
 
-    # Helper to create a true function wrapper with metadata
-    def create_tool_wrapper(func, c_id, c_phone):
-        async def wrapper(params, **kwargs):
-            # Inject context variables into the call
-            return await func(params, client_id=c_id, caller_phone=c_phone, **kwargs)
-
-        # Copy metadata so Pipecat can introspect it
-        wrapper.__name__ = func.__name__
-        wrapper.__doc__ = func.__doc__
-        return wrapper
-
     for tool_name in enabled_tools:
-        tool_func = tool_map.get(tool_name)
+        tool_func = TOOL_MAP.get(tool_name)
         if tool_func:
             # Create a SAFE wrapper with the client_id bound to it
             safe_tool = create_tool_wrapper(tool_func, client_id, caller_phone)
@@ -339,12 +639,326 @@ async def initialize_client_services(
         else:
             logger.warning(f"Unknown tool requested in config: {tool_name}")
 
-    # Fallback env vars (Deprecating usage, but keeping for safety)
-    os.environ["CLIENT_ID"] = client_id
+    # Task-local fallback context for tools; replaces the old os.environ
+    # writes that raced between concurrent calls
+    call_context.CLIENT_ID.set(client_id)
     if caller_phone:
-        os.environ["CALLER_PHONE"] = caller_phone
+        call_context.CALLER_PHONE.set(caller_phone)
+
+    tools_key = tuple(enabled_tools)
+    tools_schema = _tools_schema_cache.get(tools_key)
+    if tools_schema is None:
+        tools_schema = ToolsSchema(
+            standard_tools=[
+                item.handler.to_function_schema()
+                for item in llm._functions.values()
+                if isinstance(item.handler, DirectFunctionWrapper)
+            ]
+        )
+        _tools_schema_cache[tools_key] = tools_schema
+
+    return stt, tts, llm, system_prompt, initial_greeting, tools_schema
+
+
+# Pre-rendered TwiML for the voice webhook: only the stream URL varies
+# per call, so skip rebuilding the VoiceResponse tree and its XML
+# serialization on every inbound ring. The URL is urlencoded with a
+# single query param, so it needs no XML attribute escaping. Matches
+# str(VoiceResponse(...)) byte for byte.
+STREAM_TWIML_TEMPLATE = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<Response><Connect><Stream url="{stream_url}" /></Connect></Response>'
+)
+
+# Rejection TwiML is fully static — render the VoiceResponse trees once
+# at import instead of per rejected call
+def _say_twiml(message: str) -> str:
+    resp = VoiceResponse()
+    resp.say(message)
+    return str(resp)
+
 
-    return stt, tts, llm, system_prompt, initial_greeting
+_INACTIVE_CLIENT_TWIML = _say_twiml(
+    "I am sorry, but this service is currently unavailable."
+)
+_UNCONFIGURED_NUMBER_TWIML = _say_twiml(
+    "I am sorry, but this number is not configured."
+)
+
+
+# Human-readable date injected into every call's system context; same
+# string all day, so format it once per day instead of per connection
+_date_cache = (None, "", "")
+
+
+def _today_str():
+    global _date_cache
+    today = datetime.date.today()
+    if today != _date_cache[0]:
+        formatted = today.strftime("%A, %B %d, %Y")
+        _date_cache = (today, formatted, f"Current date: {formatted}.")
+    return _date_cache[1]
+
+
+def _date_context_line():
+    """The fully assembled system-context date line, cached per day."""
+    _today_str()
+    return _date_cache[2]
+
+
+# Billing encoder, loaded once: get_encoding re-checks the on-disk BPE
+# cache per call otherwise. Lazy so import never touches the network.
+_token_encoder = None
+
+
+def _get_token_encoder():
+    global _token_encoder
+    if _token_encoder is None:
+        _token_encoder = tiktoken.get_encoding("o200k_base")  # GPT-4o standard
+    return _token_encoder
+
+
+@functools.lru_cache(maxsize=256)
+def _cached_token_count(s: str) -> int:
+    """Token count memo for strings that repeat across calls verbatim."""
+    return len(_get_token_encoder().encode_ordinary(s))
+
+
+def _normalize_messages(messages):
+    """
+    One pass over a call's messages — dicts or Pipecat message objects —
+    into parallel (roles, contents, tool_calls) lists. Metering and the
+    transcript both consume these, so the per-message isinstance/getattr
+    dispatch is paid once per call instead of once per consumer.
+    """
+    roles = []
+    contents = []
+    tool_calls = []
+    for msg in messages:
+        if isinstance(msg, dict):
+            roles.append(msg.get("role", ""))
+            contents.append(str(msg.get("content", "")))
+            tool_calls.append(msg.get("tool_calls"))
+        else:
+            roles.append(getattr(msg, "role", ""))
+            contents.append(str(getattr(msg, "content", "")))
+            tool_calls.append(getattr(msg, "tool_calls", None))
+    return roles, contents, tool_calls
+
+
+def _count_message_tokens(roles, contents):
+    """
+    Token/character metering over a call's normalized messages for
+    billing. Contents are bucketed by role, then tokenized with
+    tiktoken's batch API, which fans out to its Rust worker pool and
+    releases the GIL — callers run this under asyncio.to_thread so
+    concurrent call teardowns don't stall the event loop.
+    Returns (input_tokens, output_tokens, tts_chars).
+    """
+    assistant_contents = []
+    user_contents = []
+    system_tokens = 0
+    for role, content in zip(roles, contents):
+        if role == "assistant":
+            assistant_contents.append(content)
+        elif role == "user":
+            user_contents.append(content)
+        elif role == "system":
+            # System contents (prompt, date line) repeat across calls, so
+            # their counts come from the memo instead of re-encoding
+            system_tokens += _cached_token_count(content)
+
+    enc = _get_token_encoder()
+    output_tokens = sum(map(len, enc.encode_ordinary_batch(assistant_contents)))
+    input_tokens = system_tokens + sum(map(len, enc.encode_ordinary_batch(user_contents)))
+    tts_chars = sum(map(len, assistant_contents))
+    return input_tokens, output_tokens, tts_chars
+
+
+def build_timestamped_transcript(roles, contents, tool_calls, base_time, initial_greeting=None):
+    """
+    Assemble the transcript written at hangup from normalized message
+    lists. Runs on the call-end path, so per-message work is kept
+    minimal: the message count and each timestamp's isoformat are
+    computed once instead of per key, and system messages are skipped
+    inline.
+    """
+    transcript = []
+
+    if initial_greeting:
+        greeting_timestamp = base_time - datetime.timedelta(
+            seconds=len(roles) + 1
+        )
+        transcript.append(
+            {
+                "role": "assistant",
+                "content": initial_greeting,
+                "timestamp": greeting_timestamp.isoformat(),
+            }
+        )
+
+    # Precompute every timestamp from one base epoch: a float subtract
+    # per message instead of a datetime subtraction, leaving the loop
+    # body with dict construction only
+    len_msgs = len(roles)
+    base_epoch = base_time.timestamp()
+    timestamps = [
+        datetime.datetime.fromtimestamp(base_epoch - (len_msgs - i)).isoformat()
+        for i in range(len_msgs)
+    ]
+
+    for i in range(len_msgs):
+        if roles[i] == "system":
+            continue
+
+        ts = timestamps[i]
+        entry = {
+            "role": roles[i],
+            "content": contents[i],
+            "timestamp": ts,
+            "created_at": ts,
+        }
+
+        # Attach tool_calls if they exist (This triggers the ⚡ icon in UI)
+        if tool_calls[i]:
+            entry["tool_calls"] = tool_calls[i]
+
+        transcript.append(entry)
+
+    return transcript
+
+
+async def finalize_call_logging(
+    client_id: str,
+    contact_id: Optional[str],
+    messages: list,
+    total_seconds: int,
+    call_end_time: datetime.datetime,
+    initial_greeting: Optional[str] = None,
+):
+    """
+    Meters, prices and records a finished call from a snapshot of its
+    messages. Runs on the background log writer so the websocket
+    handlers close as soon as the call ends — token counting, transcript
+    assembly and the Supabase writes all happen here. Prefers the
+    finalize_call RPC (one transactional round-trip); falls back to the
+    sequential conversation + ledger inserts when the RPC is missing.
+    """
+    roles, contents, tool_calls = _normalize_messages(messages)
+
+    input_tokens = 0
+    output_tokens = 0
+    tts_chars = 0
+    try:
+        input_tokens, output_tokens, tts_chars = await asyncio.to_thread(
+            _count_message_tokens, roles, contents
+        )
+    except Exception as e:
+        logger.error(f"Token count failed: {e}")
+
+    logger.info(
+        "[METRICS DEBUG] Input tokens: %s, Output tokens: %s, TTS chars: %s",
+        input_tokens, output_tokens, tts_chars,
+    )
+
+    transcript = build_timestamped_transcript(
+        roles, contents, tool_calls, call_end_time, initial_greeting
+    )
+
+    # Pricing inputs next — both lookups are cached and independent, so
+    # cache misses overlap instead of paying two round-trips in sequence
+    client_config, system_rates = await asyncio.gather(
+        get_client_config_cached(client_id), get_system_rates()
+    )
+    llm_model = (
+        client_config.get("llm_model", "openai/gpt-4o-mini")
+        if client_config
+        else "openai/gpt-4o-mini"
+    )
+    # Defaults if DB fetch fails
+    cost_twilio = system_rates.get("twilio_cost_per_min", 0.013)
+    cost_stt = system_rates.get("stt_cost_per_min", 0.0043)
+    cost_tts = system_rates.get("tts_cost_per_char", 0.00003)
+
+    # Calculate costs
+    model_price = await get_model_price(llm_model)
+    if model_price:
+        input_cost = input_tokens * model_price["input"]
+        output_cost = output_tokens * model_price["output"]
+    else:
+        input_cost = 0.0
+        output_cost = 0.0
+
+    audio_minutes = total_seconds / 60
+    stt_cost = audio_minutes * cost_stt
+    twilio_cost = audio_minutes * cost_twilio
+    combined_audio_cost = stt_cost + twilio_cost
+    tts_cost = tts_chars * cost_tts
+
+    metrics = {
+        "duration": total_seconds,
+        "llm_tokens_input": input_tokens,
+        "llm_tokens_output": output_tokens,
+        "tts_characters": tts_chars,
+    }
+    costs = {
+        "duration": combined_audio_cost,
+        "llm_tokens_input": input_cost,
+        "llm_tokens_output": output_cost,
+        "tts_characters": tts_cost,
+    }
+
+    # 1. Preferred path: conversation + ledger in a single transaction
+    ledger_rows = [
+        {"metric_type": m_type, "quantity": qty, "cost_usd": costs.get(m_type)}
+        for m_type, qty in metrics.items()
+        if qty > 0
+    ]
+    actual_conv_id = await finalize_call_record(
+        client_id, contact_id, transcript, total_seconds, ledger_rows
+    )
+    if actual_conv_id:
+        logger.info(f"CAPTURED CONVERSATION ID: {actual_conv_id}")
+        return
+
+    # 2. Fallback: Log Conversation
+    response_obj = await log_conversation(
+        contact_id=contact_id,
+        client_id=client_id,
+        transcript=transcript,
+        duration=total_seconds,
+    )
+
+    # SAFE EXTRACTION: Get the string ID from the object
+    actual_conv_id = None
+    try:
+        # Check if we got a valid response object with data
+        if response_obj and hasattr(response_obj, "data") and response_obj.data:
+            actual_conv_id = response_obj.data[0]["id"]
+            logger.info(f"CAPTURED CONVERSATION ID: {actual_conv_id}")
+        else:
+            logger.error(f"LOGGING ERROR: Could not extract ID from: {response_obj}")
+    except Exception as e:
+        logger.error(f"LOGGING EXCEPTION: {e}")
+
+    # 3. Log to Ledger (Only if we have a valid string ID)
+    if actual_conv_id:
+        await log_usage_ledger(client_id, actual_conv_id, metrics, costs)
+
+
+async def finalize_log_writer(queue: "asyncio.Queue"):
+    """
+    Drains deferred call-logging jobs queued by the websocket handlers.
+    Keeps Supabase round-trips off the call-teardown path.
+    """
+    while True:
+        job = await queue.get()
+        try:
+            await finalize_call_logging(**job)
+        except Exception as e:
+            logger.error(f"Deferred call logging failed: {e}")
+        finally:
+            queue.task_done()
 
 
 @app.post("/voice")
@@ -359,10 +973,10 @@ async def voice_handler(request: Request):
     from_number = form_data.get("From")
     to_number = form_data.get("To")  # The Twilio number being called
 
-    logger.info(f"Incoming call: From {from_number} -> To {to_number}")
+    logger.info("Incoming call: From %s -> To %s", from_number, to_number)
 
     # 1. Find which client owns this Twilio number
-    client = await get_client_by_phone(to_number)
+    client = await get_client_by_phone_cached(to_number)
 
     # Fallback: If no match, check if a default CLIENT_ID is set in .env (Legacy Mode)
     if not client and os.environ.get("CLIENT_ID"):
@@ -375,31 +989,36 @@ async def voice_handler(request: Request):
         # Check if client is active. Default to True for backward compatibility.
         is_active = client.get("is_active", True)
         if is_active is False:
-            logger.info(f"REJECTING CALL: Client {client.get('id')} is inactive.")
-            resp = VoiceResponse()
-            resp.say("I am sorry, but this service is currently unavailable.")
-            return Response(content=str(resp), media_type="application/xml")
+            logger.info("REJECTING CALL: Client %s is inactive.", client.get("id"))
+            return Response(
+                content=_INACTIVE_CLIENT_TWIML, media_type="application/xml"
+            )
 
     if not client:
         logger.error(f"REJECTING CALL: No client configuration found for {to_number}")
-        resp = VoiceResponse()
-        resp.say("I am sorry, but this number is not configured.")
-        return Response(content=str(resp), media_type="application/xml")
+        return Response(
+            content=_UNCONFIGURED_NUMBER_TWIML, media_type="application/xml"
+        )
 
     client_id = client["id"]
 
-    # 2. Build the Websocket URL with the Client ID
-    encoded_from = urllib.parse.quote(from_number) if from_number else "anonymous"
-    stream_url = f"wss://{host}/ws/{client_id}/{encoded_from}"
+    # 2. Build the Websocket URL with the Client ID; the caller's number
+    # rides as a query parameter so the endpoint doesn't need a
+    # path-encode/unquote round trip. E.164 numbers (+digits) take a
+    # fast path — only the leading '+' needs escaping in a query string
+    # — and anything else goes through urlencode.
+    if from_number and from_number.startswith("+") and from_number[1:].isdigit():
+        phone_query = f"phone=%2B{from_number[1:]}"
+    else:
+        phone_query = urllib.parse.urlencode({"phone": from_number or "anonymous"})
+    stream_url = f"wss://{host}/ws/{client_id}?{phone_query}"
 
-    logger.info(f"Routing to: {stream_url}")
+    logger.info("Routing to: %s", stream_url)
 
-    response = VoiceResponse()
-    connect = Connect()
-    stream = Stream(url=stream_url)
-    connect.append(stream)
-    response.append(connect)
-    return Response(content=str(response), media_type="application/xml")
+    return Response(
+        content=STREAM_TWIML_TEMPLATE.format(stream_url=stream_url),
+        media_type="application/xml",
+    )
 
 
 @app.post("/transfer-callback")
@@ -413,60 +1032,75 @@ async def transfer_callback_handler(request: Request):
     dial_call_status = form_data.get("DialCallStatus")
     call_sid = form_data.get("CallSid")
 
-    logger.info(f"[TRANSFER CALLBACK] Call {call_sid} - Status: {dial_call_status}")
+    logger.info("[TRANSFER CALLBACK] Call %s - Status: %s", call_sid, dial_call_status)
 
     response = VoiceResponse()
 
     # If the transfer failed, we could return to AI or take a message
     # For now, we'll just end the call politely
     if dial_call_status in ["busy", "no-answer", "failed", "canceled"]:
-        logger.warning(f"[TRANSFER] Transfer failed with status: {dial_call_status}")
+        logger.warning("[TRANSFER] Transfer failed with status: %s", dial_call_status)
         response.say("I'm sorry, but the transfer could not be completed. Please try calling back later. Goodbye.")
     else:
         # Transfer succeeded - call is now connected, no need to do anything
-        logger.info(f"[TRANSFER] Transfer completed successfully")
+        logger.info("[TRANSFER] Transfer completed successfully")
 
     return Response(content=str(response), media_type="application/xml")
 
 
-@app.websocket("/ws/{client_id}/{caller_phone}")
-async def websocket_endpoint(websocket: WebSocket, client_id: str, caller_phone: str):
-    # 1. CHECK: Verify Balance
-    balance_seconds = await get_client_balance(client_id)
+@app.websocket("/ws/{client_id}")
+async def websocket_endpoint(websocket: WebSocket, client_id: str):
+    # 1. CHECK: Verify Balance (overlapped with the config fetch — both
+    # are independent round-trips on the time-to-first-audio path)
+    balance_seconds, client_config = await asyncio.gather(
+        get_client_balance(client_id), get_client_config_cached(client_id)
+    )
     if balance_seconds <= 0:
-        logger.warning(f"Client {client_id} has zero balance. Rejecting.")
+        logger.warning("Client %s has zero balance. Rejecting.", client_id)
         await websocket.close(code=4002, reason="Insufficient Funds")
         return
 
-    caller_phone_decoded = urllib.parse.unquote(caller_phone)
-
-    services = await initialize_client_services(client_id, caller_phone_decoded)
-    if not services:
-        await websocket.close()
-        return
-    stt, tts, llm, system_prompt, initial_greeting = services
+    # Starlette decodes query params once; no manual unquote needed
+    caller_phone_decoded = websocket.query_params.get("phone") or "anonymous"
 
     # Fetch Runner from app state
     runner: PipelineRunner = websocket.app.state.runner
     test_mode: bool = websocket.app.state.test_mode
     shutdown_event: asyncio.Event = websocket.app.state.shutdown_event
 
-    logger.info(f"Websocket connected for Client: {client_id}, Caller: {caller_phone}")
-    await websocket.accept()
+    # Kick off the accept handshake and service construction together,
+    # then overlap the telephony start-frame parse with the contact
+    # upsert: every independent await on the time-to-first-audio path
+    # runs concurrently. Twilio streams 8 kHz audio; the services are
+    # pinned to the wire rate.
+    accept_task = asyncio.create_task(websocket.accept())
+    services_task = asyncio.create_task(
+        initialize_client_services(
+            client_id, caller_phone_decoded, audio_sample_rate=8000,
+            client_config=client_config,
+        )
+    )
+    await accept_task
+    logger.info("Websocket connected for Client: %s, Caller: %s", client_id, caller_phone_decoded)
 
-    _, call_data = await parse_telephony_websocket(websocket)
+    (_, call_data), contact, services = await asyncio.gather(
+        parse_telephony_websocket(websocket),
+        get_or_create_contact(caller_phone_decoded, client_id),
+        services_task,
+    )
+    if not services:
+        await websocket.close()
+        return
+    stt, tts, llm, system_prompt, initial_greeting, tools_schema = services
 
     # --- Call Tracking (LIVE) ---
     call_id = call_data["call_id"]
     try:
-        # Fetch client config again to get name and owner
-        # Optimization: initialize_client_services could return this, but this is safer for now
-        cc = await get_client_config(client_id)
         active_calls[call_id] = {
             "call_id": call_id,
             "client_id": client_id,
-            "client_name": cc.get("name", "Unknown Agent"),
-            "owner_user_id": cc.get("owner_user_id", ""),
+            "client_name": client_config.get("name", "Unknown Agent"),
+            "owner_user_id": client_config.get("owner_user_id", ""),
             "caller_phone": caller_phone_decoded,
             "start_time": datetime.datetime.now().isoformat(),
         }
@@ -474,13 +1108,6 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str, caller_phone:
         logger.error(f"Failed to register active call: {e}")
     # ----------------------------
 
-    # --- Contact Management (Scoped to Client) ---
-    contact = None
-    if caller_phone_decoded:
-        # FIX: Pass client_id to the function
-        contact = await get_or_create_contact(caller_phone_decoded, client_id)
-
-    contact_context = ""
     if contact:
         name_str = contact.get("name") or "unknown"
         contact_context = f"Known caller: {name_str} (phone: {caller_phone_decoded})"
@@ -488,7 +1115,6 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str, caller_phone:
         contact_context = f"New caller (phone: {caller_phone_decoded})"
 
     # --- Calendar Context Injection ---
-    client_config = await get_client_config(client_id)
     if client_config:
         calendar_id = client_config.get("calendar_id", "primary")
         appt_context = await get_upcoming_appointments(
@@ -496,19 +1122,23 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str, caller_phone:
         )
         if appt_context:
             contact_context += f"\n[EXISTING BOOKINGS]\n{appt_context}"
-            logger.info(f"Injected appointments: {appt_context}")
+            logger.info("Injected appointments: %s", appt_context)
 
-    logger.info(f"Context: {contact_context}")
+    logger.info("Context: %s", contact_context)
 
-    # Inject CALLER_PHONE for tools
-    os.environ["CALLER_PHONE"] = caller_phone_decoded
+    # Inject the fallback tool context here rather than relying on the
+    # copies set inside the services task — ContextVar writes made in
+    # that task don't propagate back to this coroutine, and the pipeline
+    # tasks created below inherit from here
+    call_context.CLIENT_ID.set(client_id)
+    call_context.CALLER_PHONE.set(caller_phone_decoded)
 
     # --- Pipeline Setup ---
     serializer = TwilioFrameSerializer(
         stream_sid=call_data["stream_id"],
         call_sid=call_data["call_id"],
-        account_sid=os.getenv("TWILIO_ACCOUNT_SID", ""),
-        auth_token=os.getenv("TWILIO_AUTH_TOKEN", ""),
+        account_sid=TWILIO_ACCOUNT_SID,
+        auth_token=TWILIO_AUTH_TOKEN,
     )
 
     transport = FastAPIWebsocketTransport(
@@ -521,40 +1151,38 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str, caller_phone:
         ),
     )
 
-    # Messages & Context
-    current_date = datetime.date.today().strftime("%A, %B %d, %Y")
+    # Messages & Context. Ordered least- to most-volatile so provider
+    # prompt caches keep the longest possible byte-identical prefix: the
+    # static per-client prompt, then the per-day date line, then the
+    # per-call caller context.
     messages = [
         {"role": "system", "content": system_prompt},
+        {"role": "system", "content": _date_context_line()},
         {"role": "system", "content": f"CALLER CONTEXT: {contact_context}"},
-        {"role": "system", "content": f"Current date: {current_date}."},
     ]
 
     # Add initial greeting to context so LLM knows it was said
     if initial_greeting:
         messages.append({"role": "assistant", "content": initial_greeting})
-        logger.info(f"[GREETING DEBUG] Added greeting to context: {initial_greeting[:50]}...")
+        logger.info("[GREETING DEBUG] Added greeting to context: %.50s...", initial_greeting)
 
-    # Tool Registration
-    from pipecat.adapters.schemas.tools_schema import ToolsSchema
-    from pipecat.adapters.schemas.direct_function import DirectFunctionWrapper
-
-    tools_list = []
-    for item in llm._functions.values():
-        if isinstance(item.handler, DirectFunctionWrapper):
-            tools_list.append(item.handler.to_function_schema())
-    tools = ToolsSchema(standard_tools=tools_list)
+    # Tool Registration: schema precomputed per enabled-tool set
+    tools = tools_schema
 
     context = LLMContext(messages, tools=tools)
-    context_aggregator = LLMContextAggregatorPair(context)
+    user_aggregator = ContextTrimmingUserAggregator(context)
     assistant_aggregator = ToolStrippingAssistantAggregator(context)
 
-    logger.info(f"[PIPELINE DEBUG] Building pipeline with components: STT={type(stt).__name__}, LLM={type(llm).__name__}, TTS={type(tts).__name__}")
+    logger.info(
+        "[PIPELINE DEBUG] Building pipeline with components: STT=%s, LLM=%s, TTS=%s",
+        type(stt).__name__, type(llm).__name__, type(tts).__name__,
+    )
 
     pipeline = Pipeline(
         [
             transport.input(),
             stt,
-            context_aggregator.user(),
+            user_aggregator,
             llm,
             tts,
             transport.output(),
@@ -562,7 +1190,7 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str, caller_phone:
         ]
     )
 
-    logger.info(f"[PIPELINE DEBUG] Pipeline created successfully")
+    logger.info("[PIPELINE DEBUG] Pipeline created successfully")
 
     task = PipelineTask(
         pipeline,
@@ -573,272 +1201,191 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str, caller_phone:
         ),
     )
 
-    logger.info(f"[PIPELINE DEBUG] PipelineTask created with sample rates: in=8000, out=8000")
+    logger.info("[PIPELINE DEBUG] PipelineTask created with sample rates: in=8000, out=8000")
 
-    logger.info(f"[RUNNER DEBUG] Starting pipeline runner for call")
-    runner_task = asyncio.create_task(runner.run(task))
-    logger.info(f"[RUNNER DEBUG] Pipeline runner task created and running")
+    logger.info("[RUNNER DEBUG] Starting pipeline runner for call")
+    if not await _acquire_call_slot():
+        active_calls.pop(call_id, None)
+        await websocket.close(code=1013, reason="Server At Capacity")
+        return
 
-    # --- Trigger Initial Greeting ---
-    # If initial greeting is configured, send it directly as TTS output
-    if initial_greeting:
-        async def trigger_greeting():
-            logger.info(f"[GREETING DEBUG] Waiting for transport to be ready...")
-            await asyncio.sleep(1.0)  # Wait for transport to be ready
-            logger.info(f"[GREETING DEBUG] Sending greeting as TTS: {initial_greeting[:50]}...")
-            # Send greeting directly to TTS
-            await task.queue_frames([TTSSpeakFrame(initial_greeting)])
-            logger.info(f"[GREETING DEBUG] Greeting sent to TTS")
-
-        asyncio.create_task(trigger_greeting())
-
-    # 2. MONITOR: Safety Valve & Cutoff
-    call_start_time = datetime.datetime.now()
-    last_deduction_time = call_start_time
+    # The slot is held from here on, so everything below — including the
+    # greeting/monitor setup — runs inside the try whose finally releases
+    # it; an exception during setup can no longer leak the permit.
+    # Durations come from the monotonic clock: immune to NTP skew and a
+    # cheaper read than wall-clock datetime.now()
+    call_start_mono = time.monotonic()
+    last_deduction_mono = call_start_mono
     accumulated_deduction = 0
-
-    async def safety_valve_sync():
-        nonlocal last_deduction_time, accumulated_deduction
-        try:
-            while True:
-                await asyncio.sleep(300)  # 5 Minutes
-                now = datetime.datetime.now()
-                chunk = int((now - last_deduction_time).total_seconds())
-                if chunk > 0:
-                    await deduct_balance(client_id, chunk)
-                    last_deduction_time = now
-                    accumulated_deduction += chunk
-        except asyncio.CancelledError:
-            pass
-
-    safety_task = asyncio.create_task(safety_valve_sync())
+    call_key = f"{client_id}:{caller_phone_decoded}"
+    runner_task = safety_task = disconnect_wait = transfer_wait = None
 
     try:
+        runner_task = asyncio.create_task(runner.run(task))
+        logger.info("[RUNNER DEBUG] Pipeline runner task created and running")
+
+        # --- Trigger Initial Greeting ---
+        # If initial greeting is configured, send it as one TTS frame as
+        # soon as the transport reports the client, not a fixed 1 s delay
+        if initial_greeting:
+            transport_ready = asyncio.Event()
+
+            @transport.event_handler("on_client_connected")
+            async def on_client_connected(transport, client):
+                transport_ready.set()
+
+            async def trigger_greeting():
+                try:
+                    await asyncio.wait_for(transport_ready.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    # Old fixed-delay behavior as the fallback
+                    logger.warning("[GREETING DEBUG] Transport ready event timed out")
+                logger.info("[GREETING DEBUG] Sending greeting as TTS: %.50s...", initial_greeting)
+                await task.queue_frames([TTSSpeakFrame(initial_greeting)])
+
+            asyncio.create_task(trigger_greeting())
+
+        # 2. MONITOR: Safety Valve & Cutoff
+        async def safety_valve_sync():
+            nonlocal last_deduction_mono, accumulated_deduction
+            try:
+                while True:
+                    await asyncio.sleep(300)  # 5 Minutes
+                    now = time.monotonic()
+                    chunk = int(now - last_deduction_mono)
+                    if chunk > 0:
+                        await deduct_balance(client_id, chunk)
+                        last_deduction_mono = now
+                        accumulated_deduction += chunk
+            except asyncio.CancelledError:
+                pass
+
+        safety_task = asyncio.create_task(safety_valve_sync())
+
+        # Event-driven wait: instead of polling websocket.client_state
+        # every 100 ms, sleep until the transport disconnects, the
+        # pipeline ends, a transfer is requested, or the balance deadline
+        # expires.
+        disconnect_event = asyncio.Event()
+
+        @transport.event_handler("on_client_disconnected")
+        async def on_client_disconnected(transport, client):
+            disconnect_event.set()
+
+        runner_task.add_done_callback(lambda _task: disconnect_event.set())
+
+        transfer_event = asyncio.Event()
+        transfer_events[call_key] = transfer_event
+
+        # Created once and reused across loop iterations; they stay
+        # pending until their event fires, so no task churn while the
+        # call runs.
+        disconnect_wait = asyncio.create_task(disconnect_event.wait())
+        transfer_wait = asyncio.create_task(transfer_event.wait())
+
         while websocket.client_state == WebSocketState.CONNECTED:
+            # 4. ENFORCE: Hard Cutoff
+            elapsed = time.monotonic() - call_start_mono
+            remaining = balance_seconds - elapsed
+            if remaining <= 0:
+                logger.warning("CUTOFF: Client %s out of funds.", client_id)
+                await websocket.close(code=4002, reason="Time Limit Exceeded")
+                break
+
+            await asyncio.wait(
+                (disconnect_wait, transfer_wait),
+                timeout=remaining,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+
+            if disconnect_event.is_set():
+                break
+
             # 3. CHECK: Transfer Request
-            call_key = f"{client_id}:{caller_phone_decoded}"
-            if call_key in transfer_requests:
+            if transfer_event.is_set() and call_key in transfer_requests:
                 transfer_info = transfer_requests.pop(call_key)
                 transfer_number = transfer_info["transfer_number"]
 
-                logger.info(f"[TRANSFER] Initiating transfer for {call_key} to {transfer_number}")
+                logger.info("[TRANSFER] Initiating transfer for %s to %s", call_key, transfer_number)
 
                 # Close the websocket stream
                 await websocket.close(code=1000, reason="Transferring Call")
 
                 # Use Twilio REST API to update the call with transfer TwiML
                 try:
-                    from twilio.twiml.voice_response import VoiceResponse, Dial
-
                     # Create TwiML for the transfer
                     response = VoiceResponse()
                     response.say("Please hold while I transfer you.")
                     dial = Dial(
-                        caller_id=os.environ.get("TWILIO_PHONE_NUMBER", caller_phone_decoded),
+                        caller_id=TWILIO_PHONE_NUMBER or caller_phone_decoded,
                         timeout=30,
                         action=f"https://{websocket.headers.get('host')}/transfer-callback"
                     )
                     dial.number(transfer_number)
                     response.append(dial)
 
-                    # Update the active call with new TwiML
-                    twilio_client.calls(call_id).update(
-                        twiml=str(response)
+                    # Update the active call with new TwiML; the sync
+                    # Twilio SDK call runs off-loop so other calls'
+                    # audio isn't stalled behind the REST round-trip
+                    await asyncio.to_thread(
+                        twilio_client.calls(call_id).update, twiml=str(response)
                     )
 
-                    logger.info(f"[TRANSFER] Call {call_id} successfully transferred to {transfer_number}")
+                    logger.info("[TRANSFER] Call %s successfully transferred to %s", call_id, transfer_number)
                 except Exception as transfer_error:
                     logger.error(f"[TRANSFER] Failed to transfer call {call_id}: {transfer_error}")
 
                 break
-
-            # 4. ENFORCE: Hard Cutoff
-            elapsed = (datetime.datetime.now() - call_start_time).total_seconds()
-            if elapsed > balance_seconds:
-                logger.warning(f"CUTOFF: Client {client_id} out of funds.")
-                await websocket.close(code=4002, reason="Time Limit Exceeded")
-                break
-            await asyncio.sleep(0.1)
     except asyncio.CancelledError:
-        logger.info(f"[CALL DEBUG] Call cancelled for {call_id}")
+        logger.info("[CALL DEBUG] Call cancelled for %s", call_id)
         pass
     finally:
-        logger.info(f"[CALL DEBUG] Call ending - Duration: {(datetime.datetime.now() - call_start_time).total_seconds():.2f}s")
+        logger.info("[CALL DEBUG] Call ending - Duration: %.2fs", time.monotonic() - call_start_mono)
 
         # --- Cleanup Active Call ---
+        # Guard each handle: a setup failure can land here before they
+        # were created
+        if disconnect_wait is not None:
+            disconnect_wait.cancel()
+        if transfer_wait is not None:
+            transfer_wait.cancel()
         active_calls.pop(call_id, None)
+        transfer_events.pop(call_key, None)
         # ---------------------------
 
-        safety_task.cancel()
+        if safety_task is not None:
+            safety_task.cancel()
+        CALL_SEMAPHORE.release()
 
         # 4. COMMIT: Finalize Billing
         call_end_time = datetime.datetime.now()
-        total_seconds = int((call_end_time - call_start_time).total_seconds())
+        total_seconds = int(time.monotonic() - call_start_mono)
 
-        logger.info(f"[BILLING DEBUG] Total call duration: {total_seconds}s")
+        logger.info("[BILLING DEBUG] Total call duration: %ss", total_seconds)
 
         remainder = total_seconds - accumulated_deduction
         if remainder > 0:
             await deduct_balance(client_id, remainder)
 
-        # 5. METRICS: Count Tokens (The Meter)
-        input_tokens = 0
-        output_tokens = 0
-        tts_chars = 0
-        try:
-            enc = tiktoken.get_encoding("o200k_base")  # GPT-4o standard
-            for msg in context.messages:
-                # Handle both dict and object messages (Pipecat compatibility)
-                if isinstance(msg, dict):
-                    role = msg.get("role", "")
-                    content = str(msg.get("content", ""))
-                else:
-                    role = getattr(msg, "role", "")
-                    content = str(getattr(msg, "content", ""))
-
-                if role == "assistant":
-                    output_tokens += len(enc.encode(content))
-                    tts_chars += len(content)
-                elif role in ["user", "system"]:
-                    input_tokens += len(enc.encode(content))
-        except Exception as e:
-            logger.error(f"Token count failed: {e}")
-
-        logger.info(f"[METRICS DEBUG] Input tokens: {input_tokens}, Output tokens: {output_tokens}, TTS chars: {tts_chars}")
-
-        # Log Conversation & Get ID
-        # Calculate transcript with timestamps
-        transcript_with_timestamps = []
-        base_time = call_end_time
-
-        # Initial Greeting Timestamp
-        if initial_greeting:
-            greeting_timestamp = base_time - datetime.timedelta(
-                seconds=len(context.messages) + 1
-            )
-            transcript_with_timestamps.insert(
-                0,
-                {
-                    "role": "assistant",
-                    "content": initial_greeting,
-                    "timestamp": greeting_timestamp.isoformat(),
-                },
-            )
-
-        for i, message in enumerate(context.messages):
-            # Skip system messages for transcript
-            msg_tool_calls = None  # 1. Initialize variable
-
-            if isinstance(message, dict):
-                if message.get("role") == "system":
-                    continue
-                msg_role = message.get("role")
-                msg_content = message.get("content")
-                msg_tool_calls = message.get("tool_calls")  # 2. Extract from dict
-            else:
-                if getattr(message, "role", "") == "system":
-                    continue
-                msg_role = getattr(message, "role", "")
-                msg_content = getattr(message, "content", "")
-                msg_tool_calls = getattr(
-                    message, "tool_calls", None
-                )  # 3. Extract from object
-
-            timestamp = base_time - datetime.timedelta(
-                seconds=len(context.messages) - i
-            )
-
-            # 4. Construct entry with optional tool_calls
-            entry = {
-                "role": msg_role,
-                "content": str(msg_content),
-                "timestamp": timestamp.isoformat(),
-                "created_at": timestamp.isoformat(),
+        # 5. METRICS + LOGGING: snapshot the messages and hand the whole
+        # metering/transcript/ledger job to the background log writer, so
+        # the socket (and its pipecat processors) are released immediately
+        websocket.app.state.finalize_queue.put_nowait(
+            {
+                "client_id": client_id,
+                "contact_id": contact["id"] if contact else None,
+                "messages": list(context.messages),
+                "total_seconds": total_seconds,
+                "call_end_time": call_end_time,
+                "initial_greeting": initial_greeting,
             }
-
-            # 5. Attach tool_calls if they exist (This triggers the ⚡ icon in UI)
-            if msg_tool_calls:
-                entry["tool_calls"] = msg_tool_calls
-
-            transcript_with_timestamps.append(entry)
-
-        # 1. Log Conversation
-        response_obj = await log_conversation(
-            contact_id=contact["id"] if contact else None,
-            client_id=client_id,
-            transcript=transcript_with_timestamps,
-            duration=total_seconds,
         )
 
-        # 2. SAFE EXTRACTION: Get the string ID from the object
-        actual_conv_id = None
-        try:
-            # Check if we got a valid response object with data
-            if response_obj and hasattr(response_obj, "data") and response_obj.data:
-                actual_conv_id = response_obj.data[0]["id"]
-                logger.info(f"CAPTURED CONVERSATION ID: {actual_conv_id}")
-            else:
-                logger.error(
-                    f"LOGGING ERROR: Could not extract ID from: {response_obj}"
-                )
-        except Exception as e:
-            logger.error(f"LOGGING EXCEPTION: {e}")
-
-        # 3. Log to Ledger (Only if we have a valid string ID)
-        if actual_conv_id:
-            # Get LLM model for pricing
-            client_config = await get_client_config(client_id)
-            llm_model = (
-                client_config.get("llm_model", "openai/gpt-4o-mini")
-                if client_config
-                else "openai/gpt-4o-mini"
-            )
-
-            # Fetch dynamic system rates
-            system_rates = await get_system_rates()
-            # Defaults if DB fetch fails
-            cost_twilio = system_rates.get("twilio_cost_per_min", 0.013)
-            cost_stt = system_rates.get("stt_cost_per_min", 0.0043)
-            cost_tts = system_rates.get("tts_cost_per_char", 0.00003)
-
-            # Calculate costs
-            model_price = await get_model_price(llm_model)
-            if model_price:
-                input_cost = input_tokens * model_price["input"]
-                output_cost = output_tokens * model_price["output"]
-            else:
-                input_cost = 0.0
-                output_cost = 0.0
-
-            audio_minutes = total_seconds / 60
-            stt_cost = audio_minutes * cost_stt
-            twilio_cost = audio_minutes * cost_twilio
-            combined_audio_cost = stt_cost + twilio_cost
-            tts_cost = tts_chars * cost_tts
-
-            costs = {
-                "duration": combined_audio_cost,
-                "llm_tokens_input": input_cost,
-                "llm_tokens_output": output_cost,
-                "tts_characters": tts_cost,
-            }
-
-            await log_usage_ledger(
-                client_id,
-                actual_conv_id,
-                {
-                    "duration": total_seconds,
-                    "llm_tokens_input": input_tokens,
-                    "llm_tokens_output": output_tokens,
-                    "tts_characters": tts_chars,
-                },
-                costs,
-            )
-
         logger.info("Call ended. Cleaning up.")
-        if not runner_task.done():
-            await task.cancel()
-        await runner_task
+        if runner_task is not None:
+            if not runner_task.done():
+                await task.cancel()
+            await runner_task
 
     if test_mode:
         shutdown_event.set()
@@ -849,27 +1396,29 @@ async def simulator_endpoint(websocket: WebSocket, client_id: str):
     # 1. CHECK: Verify Balance
     balance_seconds = await get_client_balance(client_id)
     if balance_seconds <= 0:
-        logger.warning(f"Client {client_id} has zero balance. Rejecting Simulator.")
+        logger.warning("Client %s has zero balance. Rejecting Simulator.", client_id)
         await websocket.close(code=4002, reason="Insufficient Funds")
         return
 
     # Initialize with special "SIMULATOR" caller
-    services = await initialize_client_services(client_id, "SIMULATOR")
+    services = await initialize_client_services(
+        client_id, "SIMULATOR", audio_sample_rate=16000
+    )
     if not services:
         await websocket.close()
         return
-    stt, tts, llm, system_prompt, initial_greeting = services
+    stt, tts, llm, system_prompt, initial_greeting, tools_schema = services
 
     # Fetch Runner from app state
     runner: PipelineRunner = websocket.app.state.runner
 
-    logger.info(f"Simulator connected for Client: {client_id}")
+    logger.info("Simulator connected for Client: %s", client_id)
     await websocket.accept()
 
     # --- Active Call Tracking (Simulator) ---
     call_id = f"sim-{client_id}-{int(datetime.datetime.now().timestamp())}"
     try:
-        cc = await get_client_config(client_id)
+        cc = await get_client_config_cached(client_id)
         active_calls[call_id] = {
             "call_id": call_id,
             "client_id": client_id,
@@ -895,35 +1444,29 @@ async def simulator_endpoint(websocket: WebSocket, client_id: str):
         ),
     )
 
-    current_date = datetime.date.today().strftime("%A, %B %d, %Y")
+    # Same least- to most-volatile ordering as the telephony endpoint so
+    # the static prompt + date prefix stays cacheable across both paths
     messages = [
         {"role": "system", "content": system_prompt},
+        {"role": "system", "content": _date_context_line()},
         {
             "role": "system",
             "content": "CONTEXT: User is testing via Browser Simulator.",
         },
-        {"role": "system", "content": f"Current date: {current_date}."},
     ]
 
-    # Tool Registration
-    from pipecat.adapters.schemas.tools_schema import ToolsSchema
-    from pipecat.adapters.schemas.direct_function import DirectFunctionWrapper
-
-    tools_list = []
-    for item in llm._functions.values():
-        if isinstance(item.handler, DirectFunctionWrapper):
-            tools_list.append(item.handler.to_function_schema())
-    tools = ToolsSchema(standard_tools=tools_list)
+    # Tool Registration: schema precomputed per enabled-tool set
+    tools = tools_schema
 
     context = LLMContext(messages, tools=tools)
-    context_aggregator = LLMContextAggregatorPair(context)
+    user_aggregator = ContextTrimmingUserAggregator(context)
     assistant_aggregator = ToolStrippingAssistantAggregator(context)
 
     pipeline = Pipeline(
         [
             transport.input(),
             stt,
-            context_aggregator.user(),
+            user_aggregator,
             llm,
             tts,
             transport.output(),
@@ -943,36 +1486,56 @@ async def simulator_endpoint(websocket: WebSocket, client_id: str):
     if initial_greeting:
         await task.queue_frames([TextFrame(initial_greeting)])
 
-    runner_task = asyncio.create_task(runner.run(task))
+    if not await _acquire_call_slot():
+        active_calls.pop(call_id, None)
+        await websocket.close(code=1013, reason="Server At Capacity")
+        return
 
-    # 2. MONITOR: Safety Valve (Copied from standard endpoint)
-    call_start_time = datetime.datetime.now()
-    last_deduction_time = call_start_time
+    # Slot held from here; setup runs inside the try whose finally
+    # releases it so a setup failure can't leak the permit.
+    # Durations come from the monotonic clock: immune to NTP skew and a
+    # cheaper read than wall-clock datetime.now()
+    call_start_mono = time.monotonic()
+    last_deduction_mono = call_start_mono
     accumulated_deduction = 0
-
-    async def safety_valve_sync():
-        nonlocal last_deduction_time, accumulated_deduction
-        try:
-            while True:
-                await asyncio.sleep(300)  # 5 Minutes
-                now = datetime.datetime.now()
-                chunk = int((now - last_deduction_time).total_seconds())
-                if chunk > 0:
-                    await deduct_balance(client_id, chunk)
-                    last_deduction_time = now
-                    accumulated_deduction += chunk
-        except asyncio.CancelledError:
-            pass
-
-    safety_task = asyncio.create_task(safety_valve_sync())
+    runner_task = safety_task = None
 
     try:
-        while websocket.client_state == WebSocketState.CONNECTED:
-            elapsed = (datetime.datetime.now() - call_start_time).total_seconds()
-            if elapsed > balance_seconds:
-                await websocket.close(code=4002, reason="Time Limit Exceeded")
-                break
-            await asyncio.sleep(0.1)
+        runner_task = asyncio.create_task(runner.run(task))
+
+        # 2. MONITOR: Safety Valve (Copied from standard endpoint)
+        async def safety_valve_sync():
+            nonlocal last_deduction_mono, accumulated_deduction
+            try:
+                while True:
+                    await asyncio.sleep(300)  # 5 Minutes
+                    now = time.monotonic()
+                    chunk = int(now - last_deduction_mono)
+                    if chunk > 0:
+                        await deduct_balance(client_id, chunk)
+                        last_deduction_mono = now
+                        accumulated_deduction += chunk
+            except asyncio.CancelledError:
+                pass
+
+        safety_task = asyncio.create_task(safety_valve_sync())
+
+        # Event-driven wait: sleep until the browser disconnects or the
+        # pipeline ends instead of polling websocket.client_state at
+        # 10 Hz; the balance deadline doubles as the wait timeout.
+        disconnect_event = asyncio.Event()
+
+        @transport.event_handler("on_client_disconnected")
+        async def on_client_disconnected(transport, client):
+            disconnect_event.set()
+
+        runner_task.add_done_callback(lambda _task: disconnect_event.set())
+
+        remaining = balance_seconds - (time.monotonic() - call_start_mono)
+        try:
+            await asyncio.wait_for(disconnect_event.wait(), timeout=max(remaining, 0))
+        except asyncio.TimeoutError:
+            await websocket.close(code=4002, reason="Time Limit Exceeded")
     except asyncio.CancelledError:
         pass
     finally:
@@ -980,175 +1543,37 @@ async def simulator_endpoint(websocket: WebSocket, client_id: str):
         # Do this FIRST so UI updates immediately
         active_calls.pop(call_id, None)
 
-        safety_task.cancel()
+        if safety_task is not None:
+            safety_task.cancel()
+        CALL_SEMAPHORE.release()
 
         # Final Billing
         call_end_time = datetime.datetime.now()
-        total_seconds = int((call_end_time - call_start_time).total_seconds())
+        total_seconds = int(time.monotonic() - call_start_mono)
         remainder = total_seconds - accumulated_deduction
         if remainder > 0:
             await deduct_balance(client_id, remainder)
 
-        # 5. METRICS: Count Tokens (The Meter)
-        input_tokens = 0
-        output_tokens = 0
-        tts_chars = 0
-        try:
-            enc = tiktoken.get_encoding("o200k_base")  # GPT-4o standard
-            for msg in context.messages:
-                # Handle both dict and object messages (Pipecat compatibility)
-                if isinstance(msg, dict):
-                    role = msg.get("role", "")
-                    content = str(msg.get("content", ""))
-                else:
-                    role = getattr(msg, "role", "")
-                    content = str(getattr(msg, "content", ""))
-
-                if role == "assistant":
-                    output_tokens += len(enc.encode(content))
-                    tts_chars += len(content)
-                elif role in ["user", "system"]:
-                    input_tokens += len(enc.encode(content))
-        except Exception as e:
-            logger.error(f"Token count failed: {e}")
-
-        logger.info(f"[METRICS DEBUG] Input tokens: {input_tokens}, Output tokens: {output_tokens}, TTS chars: {tts_chars}")
-
-        # Log Conversation & Get ID
-        # Calculate transcript with timestamps
-        transcript_with_timestamps = []
-        base_time = call_end_time
-
-        # Initial Greeting Timestamp
-        if initial_greeting:
-            greeting_timestamp = base_time - datetime.timedelta(
-                seconds=len(context.messages) + 1
-            )
-            transcript_with_timestamps.insert(
-                0,
-                {
-                    "role": "assistant",
-                    "content": initial_greeting,
-                    "timestamp": greeting_timestamp.isoformat(),
-                },
-            )
-
-        for i, message in enumerate(context.messages):
-            # Skip system messages for transcript
-            msg_tool_calls = None  # 1. Initialize variable
-
-            if isinstance(message, dict):
-                if message.get("role") == "system":
-                    continue
-                msg_role = message.get("role")
-                msg_content = message.get("content")
-                msg_tool_calls = message.get("tool_calls")  # 2. Extract from dict
-            else:
-                if getattr(message, "role", "") == "system":
-                    continue
-                msg_role = getattr(message, "role", "")
-                msg_content = getattr(message, "content", "")
-                msg_tool_calls = getattr(
-                    message, "tool_calls", None
-                )  # 3. Extract from object
-
-            timestamp = base_time - datetime.timedelta(
-                seconds=len(context.messages) - i
-            )
-
-            # 4. Construct entry with optional tool_calls
-            entry = {
-                "role": msg_role,
-                "content": str(msg_content),
-                "timestamp": timestamp.isoformat(),
-                "created_at": timestamp.isoformat(),
+        # Defer metering, transcript assembly and the Supabase writes to
+        # the background log writer
+        websocket.app.state.finalize_queue.put_nowait(
+            {
+                "client_id": client_id,
+                "contact_id": None,
+                "messages": list(context.messages),
+                "total_seconds": total_seconds,
+                "call_end_time": call_end_time,
+                "initial_greeting": initial_greeting,
             }
-
-            # 5. Attach tool_calls if they exist (This triggers the ⚡ icon in UI)
-            if msg_tool_calls:
-                entry["tool_calls"] = msg_tool_calls
-
-            transcript_with_timestamps.append(entry)
-
-        # 1. Log Conversation
-        response_obj = await log_conversation(
-            contact_id=None,
-            client_id=client_id,
-            transcript=transcript_with_timestamps,
-            duration=total_seconds,
         )
 
-        # 2. SAFE EXTRACTION: Get the string ID from the object
-        actual_conv_id = None
-        try:
-            # Check if we got a valid response object with data
-            if response_obj and hasattr(response_obj, "data") and response_obj.data:
-                actual_conv_id = response_obj.data[0]["id"]
-                logger.info(f"CAPTURED CONVERSATION ID: {actual_conv_id}")
-            else:
-                logger.error(
-                    f"LOGGING ERROR: Could not extract ID from: {response_obj}"
-                )
-        except Exception as e:
-            logger.error(f"LOGGING EXCEPTION: {e}")
-
-        # 3. Log to Ledger (Only if we have a valid string ID)
-        if actual_conv_id:
-            # Get LLM model for pricing
-            client_config = await get_client_config(client_id)
-            llm_model = (
-                client_config.get("llm_model", "openai/gpt-4o-mini")
-                if client_config
-                else "openai/gpt-4o-mini"
-            )
-
-            # Fetch dynamic system rates
-            system_rates = await get_system_rates()
-            # Defaults if DB fetch fails
-            cost_twilio = system_rates.get("twilio_cost_per_min", 0.013)
-            cost_stt = system_rates.get("stt_cost_per_min", 0.0043)
-            cost_tts = system_rates.get("tts_cost_per_char", 0.00003)
-
-            # Calculate costs
-            model_price = await get_model_price(llm_model)
-            if model_price:
-                input_cost = input_tokens * model_price["input"]
-                output_cost = output_tokens * model_price["output"]
-            else:
-                input_cost = 0.0
-                output_cost = 0.0
-
-            audio_minutes = total_seconds / 60
-            stt_cost = audio_minutes * cost_stt
-            twilio_cost = audio_minutes * cost_twilio
-            combined_audio_cost = stt_cost + twilio_cost
-            tts_cost = tts_chars * cost_tts
-
-            costs = {
-                "duration": combined_audio_cost,
-                "llm_tokens_input": input_cost,
-                "llm_tokens_output": output_cost,
-                "tts_characters": tts_cost,
-            }
-
-            await log_usage_ledger(
-                client_id,
-                actual_conv_id,
-                {
-                    "duration": total_seconds,
-                    "llm_tokens_input": input_tokens,
-                    "llm_tokens_output": output_tokens,
-                    "tts_characters": tts_chars,
-                },
-                costs,
-            )
-
-        if not runner_task.done():
-            await task.cancel()
-        try:
-            await runner_task
-        except Exception as e:
-            logger.error(f"Simulator Runner Error (Ignored): {e}")
+        if runner_task is not None:
+            if not runner_task.done():
+                await task.cancel()
+            try:
+                await runner_task
+            except Exception as e:
+                logger.error(f"Simulator Runner Error (Ignored): {e}")
 
 
 # --- CRUD Endpoints ---
@@ -1191,21 +1616,29 @@ class ClientUpdate(BaseModel):
 
 
 class CheckoutSessionRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     client_id: str
     package_id: str
 
 
 class UserRegister(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     email: EmailStr
     password: str
 
 
 class UserLogin(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     email: EmailStr
     password: str
 
 
 class AdjustBalanceRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     client_id: str
     amount_seconds: int
     reason: str
@@ -1224,21 +1657,34 @@ class AdminClientUpdate(BaseModel):
 
 
 class UpdateSystemRateRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     key: str
     value: str
 
 
-@app.post("/api/auth/register")
-async def register_user(user: UserRegister):
+def get_supabase_dependency():
+    """
+    FastAPI dependency handing endpoints the process-wide Supabase
+    client (one shared connection pool; see get_supabase_client).
+    """
     supabase = get_supabase_client()
     if not supabase:
         raise HTTPException(500, "Supabase client not initialized")
+    return supabase
+
+
+@app.post("/api/auth/register")
+async def register_user(user: UserRegister, supabase=Depends(get_supabase_dependency)):
     try:
-        response = supabase.auth.sign_up(
+        # supabase-py auth is synchronous; run the round-trip on a worker
+        # thread so it can't stall live call audio on the event loop
+        response = await asyncio.to_thread(
+            supabase.auth.sign_up,
             {
                 "email": user.email,
                 "password": user.password,
-            }
+            },
         )
         if response.user:
             return {
@@ -1257,16 +1703,14 @@ async def register_user(user: UserRegister):
 
 
 @app.post("/api/auth/login")
-async def login_user(user: UserLogin):
-    supabase = get_supabase_client()
-    if not supabase:
-        raise HTTPException(500, "Supabase client not initialized")
+async def login_user(user: UserLogin, supabase=Depends(get_supabase_dependency)):
     try:
-        response = supabase.auth.sign_in_with_password(
+        response = await asyncio.to_thread(
+            supabase.auth.sign_in_with_password,
             {
                 "email": user.email,
                 "password": user.password,
-            }
+            },
         )
         if response.session:
             return {
@@ -1413,8 +1857,10 @@ async def get_available_numbers(
     area_code: str, token: str = Depends(get_current_user_token)
 ):
     try:
-        numbers = twilio_client.available_phone_numbers("US").local.list(
-            area_code=area_code, limit=5
+        numbers = await asyncio.to_thread(
+            twilio_client.available_phone_numbers("US").local.list,
+            area_code=area_code,
+            limit=5,
         )
         return {"numbers": [n.phone_number for n in numbers]}
     except Exception as e:
@@ -1429,7 +1875,7 @@ async def get_available_numbers(
 
 @app.get("/api/clients")
 async def list_clients(token: str = Depends(get_current_user_token)):
-    clients = await get_all_clients(token)
+    clients = await get_all_clients_cached(token)
     if clients is None:
         raise HTTPException(500, "Failed to fetch clients")
     return {"clients": clients}
@@ -1444,16 +1890,17 @@ async def create_new_client(
 
     # 2. Create DB Record
     new_client = await create_client_record(
-        client.dict(exclude={"selected_number"}), token
+        client.model_dump(exclude={"selected_number"}), token
     )
     if new_client is None:
         raise HTTPException(500, "Failed to create client")
+    invalidate_client_caches()
     return new_client
 
 
 @app.get("/api/clients/{client_id}")
 async def get_client(client_id: str):
-    client = await get_client_config(client_id)
+    client = await get_client_config_cached(client_id)
     if client is None:
         raise HTTPException(404, "Client not found")
     return client
@@ -1486,7 +1933,7 @@ async def update_existing_client(
                 logger.info(
                     f"Releasing old number {current_config['cell']} for client {client_id}"
                 )
-                release_twilio_number(current_config["cell"])
+                await release_twilio_number(current_config["cell"])
 
             # B. Buy New Number
             base_url = os.environ.get("BASE_URL")
@@ -1496,8 +1943,10 @@ async def update_existing_client(
 
             webhook_url = f"{base_url}/voice"
 
-            purchased_number = twilio_client.incoming_phone_numbers.create(
-                phone_number=client.selected_number, voice_url=webhook_url
+            purchased_number = await asyncio.to_thread(
+                twilio_client.incoming_phone_numbers.create,
+                phone_number=client.selected_number,
+                voice_url=webhook_url,
             )
 
             # C. Update the 'cell' field in the update payload
@@ -1512,14 +1961,13 @@ async def update_existing_client(
                 status_code=400, detail=f"Failed to purchase number: {str(e)}"
             )
 
-    data = {
-        k: v
-        for k, v in client.dict().items()
-        if v is not None and k != "selected_number"
-    }
+    # Pydantic's C-level exclude paths do the filtering; .dict() is also
+    # deprecated in v2
+    data = client.model_dump(exclude_none=True, exclude={"selected_number"})
     updated = await update_client(client_id, data, token)
     if updated is None:
         raise HTTPException(500, "Failed to update")
+    invalidate_client_caches(client_id)
     return updated
 
 
@@ -1532,11 +1980,12 @@ async def delete_existing_client(
 
     # 2. Release Twilio Number if it exists
     if client_data and client_data.get("cell"):
-        release_twilio_number(client_data["cell"])
+        await release_twilio_number(client_data["cell"])
 
     # 3. Proceed with database deletion
     if not await delete_client(client_id, token):
         raise HTTPException(500, "Failed to delete")
+    invalidate_client_caches(client_id)
     return {"message": "Deleted"}
 
 
@@ -1945,6 +2394,8 @@ async def get_admin_dashboard(token: str = Depends(get_current_user_token)):
         "users": users,
         "total_seconds_today": global_stats.get("total_seconds_today", 0),
         "total_seconds_month": global_stats.get("total_seconds_month", 0),
+        "max_concurrent_calls": MAX_CONCURRENT_CALLS,
+        "calls_waiting_for_slot": _calls_waiting_for_slot,
     }
 
 
@@ -1973,6 +2424,10 @@ async def admin_adjust_balance(
     if not success:
         raise HTTPException(status_code=500, detail="Failed to adjust balance")
 
+    # Cached client rows include balance_seconds; drop them so the
+    # dashboard reflects the credit immediately
+    invalidate_client_caches(request.client_id)
+
     return {"message": "Balance adjusted successfully"}
 
 
@@ -2045,12 +2500,13 @@ async def admin_update_client_endpoint(
         raise HTTPException(status_code=403, detail="Forbidden")
 
     # Filter out None values
-    data = {k: v for k, v in client_data.dict().items() if v is not None}
+    data = client_data.model_dump(exclude_none=True)
 
     updated_client = await admin_update_client(client_id, data)
 
     if not updated_client:
         raise HTTPException(status_code=500, detail="Failed to update client")
+    invalidate_client_caches(client_id)
 
     return updated_client
 
@@ -2381,6 +2837,9 @@ async def stripe_webhook(request: Request):
                 await adjust_client_balance(
                     client_id, seconds, "STRIPE_TOPUP", revenue_usd
                 )
+                # Cached client rows include balance_seconds; drop them
+                # so the dashboard reflects the top-up immediately
+                invalidate_client_caches(client_id)
             except Exception as e:
                 logger.error(f"Error processing stripe fulfillment: {e}")
                 return Response(status_code=500)
@@ -2396,11 +2855,15 @@ async def main():
     runner = PipelineRunner()
     template_manager = TemplateManager()
     shutdown_event = asyncio.Event()
+    finalize_queue = asyncio.Queue()
 
     app.state.runner = runner
     app.state.template_manager = template_manager
     app.state.test_mode = args.test_mode
     app.state.shutdown_event = shutdown_event
+    app.state.finalize_queue = finalize_queue
+
+    log_writer_task = asyncio.create_task(finalize_log_writer(finalize_queue))
 
     # Sync pricing data on startup
     logging.info("Syncing OpenRouter pricing data...")
@@ -2410,7 +2873,12 @@ async def main():
     except Exception as e:
         logging.warning(f"Failed to sync pricing data: {e}. Continuing without price sync.")
 
-    config = uvicorn.Config(app, host="0.0.0.0", port=8000, log_level="info")
+    # httptools is a C HTTP parser; the event loop itself is switched to
+    # uvloop at the entrypoint below, before asyncio.run starts it.
+    config = uvicorn.Config(
+        app, host="0.0.0.0", port=8000, log_level="info", http="httptools",
+        ws="websockets", access_log=False,
+    )
     server = uvicorn.Server(config)
     server_task = asyncio.create_task(server.serve())
 
@@ -2425,8 +2893,41 @@ async def main():
         await shutdown_event.wait()
     finally:
         server.should_exit = True
-        await asyncio.gather(server_task, runner.cancel(), return_exceptions=True)
+        # Drain any deferred call logs before shutting the writer down
+        await finalize_queue.join()
+        log_writer_task.cancel()
+        await asyncio.gather(
+            server_task, runner.cancel(), log_writer_task, return_exceptions=True
+        )
+        # Flush queued log records and stop the listener thread last so
+        # shutdown messages still reach disk
+        _log_listener.stop()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        import uvloop
+
+        uvloop.install()
+    except ImportError:
+        pass
+
+    # WEB_CONCURRENCY > 1 spawns that many worker processes so CPU-bound
+    # work (Pydantic validation, JSON serialization) scales across cores.
+    # Per-worker state comes from the lifespan handler; note that
+    # active_calls/transfer state is per-process, so the admin views only
+    # see the calls owned by the worker that answers them.
+    workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=8000,
+            log_level="info",
+            http="httptools",
+            ws="websockets",
+            access_log=False,
+            workers=workers,
+        )
+    else:
+        asyncio.run(main())
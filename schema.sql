@@ -52,6 +52,55 @@ CREATE EXTENSION IF NOT EXISTS "uuid-ossp" WITH SCHEMA "extensions";
 
 
 
+CREATE OR REPLACE FUNCTION "public"."analyze_usage"("days" integer DEFAULT 30) RETURNS TABLE("metric_type" "text", "total_cost" numeric, "total_qty" numeric, "n" bigint)
+    LANGUAGE "plpgsql"
+    AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        ul.metric_type::text,
+        COALESCE(SUM(ul.cost_usd), 0)::numeric AS total_cost,
+        COALESCE(SUM(ul.quantity), 0)::numeric AS total_qty,
+        COUNT(*)::bigint AS n
+    FROM usage_ledger ul
+    WHERE ul.created_at >= now() - (days || ' days')::interval
+    GROUP BY ul.metric_type;
+END;
+$$;
+
+
+ALTER FUNCTION "public"."analyze_usage"("days" integer) OWNER TO "postgres";
+
+
+CREATE OR REPLACE FUNCTION "public"."finalize_call"("p_client_id" "uuid", "p_contact_id" "uuid", "p_transcript" "jsonb", "p_duration" integer, "p_metrics" "jsonb") RETURNS "uuid"
+    LANGUAGE "plpgsql"
+    AS $$
+DECLARE
+    v_conversation_id uuid;
+BEGIN
+    -- One transaction: the conversation row and its ledger breakdown are
+    -- written together, so a failure can't leave orphan ledger entries.
+    INSERT INTO conversations (contact_id, client_id, transcript, duration)
+    VALUES (p_contact_id, p_client_id, p_transcript, p_duration)
+    RETURNING id INTO v_conversation_id;
+
+    INSERT INTO usage_ledger (client_id, conversation_id, metric_type, quantity, cost_usd)
+    SELECT
+        p_client_id,
+        v_conversation_id,
+        m->>'metric_type',
+        (m->>'quantity')::integer,
+        (m->>'cost_usd')::numeric
+    FROM jsonb_array_elements(p_metrics) AS m;
+
+    RETURN v_conversation_id;
+END;
+$$;
+
+
+ALTER FUNCTION "public"."finalize_call"("p_client_id" "uuid", "p_contact_id" "uuid", "p_transcript" "jsonb", "p_duration" integer, "p_metrics" "jsonb") OWNER TO "postgres";
+
+
 CREATE OR REPLACE FUNCTION "public"."get_client_usage_stats"() RETURNS TABLE("client_id" "text", "seconds_today" bigint, "seconds_month" bigint)
     LANGUAGE "plpgsql"
     AS $$
@@ -523,6 +572,18 @@ GRANT USAGE ON SCHEMA "public" TO "service_role";
 
 
 
+
+
+
+GRANT ALL ON FUNCTION "public"."analyze_usage"("days" integer) TO "anon";
+GRANT ALL ON FUNCTION "public"."analyze_usage"("days" integer) TO "authenticated";
+GRANT ALL ON FUNCTION "public"."analyze_usage"("days" integer) TO "service_role";
+
+
+
+GRANT ALL ON FUNCTION "public"."finalize_call"("p_client_id" "uuid", "p_contact_id" "uuid", "p_transcript" "jsonb", "p_duration" integer, "p_metrics" "jsonb") TO "anon";
+GRANT ALL ON FUNCTION "public"."finalize_call"("p_client_id" "uuid", "p_contact_id" "uuid", "p_transcript" "jsonb", "p_duration" integer, "p_metrics" "jsonb") TO "authenticated";
+GRANT ALL ON FUNCTION "public"."finalize_call"("p_client_id" "uuid", "p_contact_id" "uuid", "p_transcript" "jsonb", "p_duration" integer, "p_metrics" "jsonb") TO "service_role";
 
 
 
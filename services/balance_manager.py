@@ -1,5 +1,6 @@
 import os
 import logging
+import time
 from typing import Dict, Any, Optional
 
 import httpx
@@ -86,10 +87,23 @@ async def get_service_balances() -> Dict[str, Any]:
     return balances
 
 
+# Rates change only when an admin edits them, but every call teardown
+# reads them for billing; serve from a short TTL cache so bursts of
+# call ends don't each pay a Supabase round-trip.
+RATES_TTL_SECONDS = 60.0
+_rates_cache = (0.0, {})  # (expires_at, rates)
+
+
 async def get_system_rates() -> Dict[str, float]:
     """
-    Fetches system rates from DB as dict.
+    Fetches system rates from DB as dict. Results are cached briefly;
+    update_system_rate invalidates on write.
     """
+    global _rates_cache
+    now = time.monotonic()
+    if _rates_cache[0] > now:
+        return _rates_cache[1]
+
     supabase: Optional[Client] = get_supabase_client()
     if not supabase:
         logger.warning("Supabase client unavailable")
@@ -97,7 +111,10 @@ async def get_system_rates() -> Dict[str, float]:
 
     try:
         resp = supabase.table("system_settings").select("key, value").execute()
-        return {row["key"]: float(row["value"]) for row in resp.data or []}
+        rates = {row["key"]: float(row["value"]) for row in resp.data or []}
+        if rates:
+            _rates_cache = (now + RATES_TTL_SECONDS, rates)
+        return rates
     except Exception as e:
         logger.error(f"Failed to fetch system rates: {e}")
         return {}
@@ -119,6 +136,8 @@ async def update_system_rate(key: str, value: str) -> bool:
             .execute()
         )
         logger.info(f"Updated system rate {key} = {value}")
+        global _rates_cache
+        _rates_cache = (0.0, {})
         return bool(resp.data)
     except Exception as e:
         logger.error(f"Failed to update system rate {key}: {e}")
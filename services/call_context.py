@@ -0,0 +1,15 @@
+"""
+Per-call context shared with the LLM tool handlers.
+
+ContextVars are task-local: every call's pipeline tasks inherit the
+values set in its websocket handler, so concurrent calls each see their
+own client/caller — unlike the os.environ fallbacks these replace,
+which were last-writer-wins across the whole process (and took a
+process-global lock on every write).
+"""
+
+from contextvars import ContextVar
+from typing import Optional
+
+CLIENT_ID: ContextVar[Optional[str]] = ContextVar("CLIENT_ID", default=None)
+CALLER_PHONE: ContextVar[Optional[str]] = ContextVar("CALLER_PHONE", default=None)
@@ -0,0 +1,76 @@
+import logging
+
+from pipecat.processors.aggregators.llm_response_universal import LLMUserAggregator
+
+logger = logging.getLogger(__name__)
+
+# Most-recent non-system messages always sent verbatim (~8 user/assistant
+# turns). Anything older only survives if it is still conversational text.
+KEEP_RECENT_MESSAGES = 16
+
+
+def _role(message):
+    if isinstance(message, dict):
+        return message.get("role")
+    return getattr(message, "role", None)
+
+
+def _tool_calls(message):
+    if isinstance(message, dict):
+        return message.get("tool_calls")
+    return getattr(message, "tool_calls", None)
+
+
+def trim_messages(messages, keep_recent=KEEP_RECENT_MESSAGES):
+    """
+    Return a pruned copy of a call's message history for the next LLM turn.
+
+    The leading run of system messages (prompt, date line, caller context)
+    is the provider-cacheable prefix and is never touched, and the last
+    `keep_recent` messages are kept verbatim. Between the two, stale tool
+    exchanges — the assistant's tool_calls stub plus the tool results that
+    answer it — are dropped: their payloads (availability JSON, lookup
+    results) are the bulk of a long call's prefill and are expired by the
+    time the conversation has moved on. Plain user/assistant text is kept
+    so the model never loses what was actually said.
+    """
+    prefix_end = 0
+    while prefix_end < len(messages) and _role(messages[prefix_end]) == "system":
+        prefix_end += 1
+
+    tail_start = max(prefix_end, len(messages) - keep_recent)
+    # Never cut between a tool_calls stub and its results: a tool message
+    # without its assistant stub is rejected by the API.
+    while tail_start > prefix_end and _role(messages[tail_start]) == "tool":
+        tail_start -= 1
+
+    if tail_start <= prefix_end:
+        return messages
+
+    middle = [
+        m
+        for m in messages[prefix_end:tail_start]
+        if _role(m) != "tool" and not _tool_calls(m)
+    ]
+    return messages[:prefix_end] + middle + messages[tail_start:]
+
+
+class ContextTrimmingUserAggregator(LLMUserAggregator):
+    """
+    User-side context aggregator that prunes stale tool exchanges from the
+    shared context before each LLM turn, keeping per-turn prefill roughly
+    flat on long calls instead of growing with every tool invocation.
+
+    The context is trimmed in place, so the transcript stored at hangup
+    also omits the dropped tool exchanges; spoken turns are never removed.
+    """
+
+    async def push_aggregation(self) -> str:
+        messages = self._context.messages
+        trimmed = trim_messages(messages)
+        if len(trimmed) < len(messages):
+            logger.debug(
+                "Trimmed context from %d to %d messages", len(messages), len(trimmed)
+            )
+            self._context.set_messages(trimmed)
+        return await super().push_aggregation()
@@ -15,6 +15,7 @@ from services.google_calendar import (
 
 # Import our new database function and the new client config function
 from services.supabase_client import update_contact_name, get_client_config, get_supabase_client
+from services import call_context
 from pipecat.services.llm_service import FunctionCallParams
 
 
@@ -28,7 +29,7 @@ async def handle_get_available_slots(
     Check for available 1-hour appointment slots on a specific day.
     Returns human-readable times in the business timezone.
     """
-    target_client_id = client_id or os.environ.get("CLIENT_ID")
+    target_client_id = client_id or call_context.CLIENT_ID.get()
     if not target_client_id:
         await params.result_callback([{"error": "Client ID is not configured."}])
         return
@@ -122,7 +123,7 @@ async def handle_book_appointment(
     """
     Book an appointment. Handles 'lazy' arguments from AI (missing end_time, etc).
     """
-    target_client_id = client_id or os.environ.get("CLIENT_ID")
+    target_client_id = client_id or call_context.CLIENT_ID.get()
     if not target_client_id:
         await params.result_callback(
             {"status": "error", "message": "Client ID missing."}
@@ -180,7 +181,7 @@ async def handle_book_appointment(
         contact_name = args.get("name") or args.get("caller_name")
 
         # 1. Get phone from Args OR Environment (System Context)
-        phone_number = args.get("phone") or os.environ.get("CALLER_PHONE")
+        phone_number = args.get("phone") or call_context.CALLER_PHONE.get()
 
         # 2. Force-append to description (Preserve AI's notes + System's data)
         if phone_number:
@@ -242,12 +243,12 @@ async def handle_save_contact_name(
     Saves contact name. Robust against missing keys.
     """
     args = params.arguments.get("kwargs", params.arguments)
-    phone_number = args.get("phone_number") or os.environ.get("CALLER_PHONE")
+    phone_number = args.get("phone_number") or call_context.CALLER_PHONE.get()
     name = args.get("name") or args.get("contact_name")
 
     # 1. Prefer the injected client_id (Thread-safe)
     # 2. Fallback to env var (Legacy/Testing)
-    target_client_id = client_id or os.environ.get("CLIENT_ID")
+    target_client_id = client_id or call_context.CLIENT_ID.get()
 
     if not phone_number or not name or not target_client_id:
         await params.result_callback(
@@ -281,7 +282,7 @@ async def handle_reschedule_appointment(
     """
     Reschedule an existing appointment to a new time.
     """
-    target_client_id = client_id or os.environ.get("CLIENT_ID")
+    target_client_id = client_id or call_context.CLIENT_ID.get()
     if not target_client_id:
         await params.result_callback(
             {"status": "error", "message": "Client ID missing."}
@@ -362,7 +363,7 @@ async def handle_cancel_appointment(
     """
     Cancel an existing appointment.
     """
-    target_client_id = client_id or os.environ.get("CLIENT_ID")
+    target_client_id = client_id or call_context.CLIENT_ID.get()
     if not target_client_id:
         await params.result_callback(
             {"status": "error", "message": "Client ID missing."}
@@ -414,7 +415,7 @@ async def handle_list_my_appointments(
     """
     List the caller's upcoming appointments with booking_ids.
     """
-    target_client_id = client_id or os.environ.get("CLIENT_ID")
+    target_client_id = client_id or call_context.CLIENT_ID.get()
     if not target_client_id:
         await params.result_callback([{"error": "No CLIENT_ID."}])
         return
@@ -423,7 +424,7 @@ async def handle_list_my_appointments(
         await params.result_callback([{"error": "No client config."}])
         return
     calendar_id = client_config.get("calendar_id", "primary")
-    phone = os.environ.get("CALLER_PHONE")
+    phone = call_context.CALLER_PHONE.get()
     if not phone:
         await params.result_callback([{"error": "No caller phone."}])
         return
@@ -449,7 +450,7 @@ async def handle_transfer_call(
     per client in their configuration. This tool signals the transfer request and
     the websocket handler will execute it.
     """
-    target_client_id = client_id or os.environ.get("CLIENT_ID")
+    target_client_id = client_id or call_context.CLIENT_ID.get()
     if not target_client_id:
         await params.result_callback(
             {"status": "error", "message": "Client ID missing."}
@@ -482,13 +483,13 @@ async def handle_transfer_call(
         logger.info(f"Transfer call requested for client {target_client_id} to {transfer_number}")
 
         # Get the caller's phone to identify the active call
-        phone = caller_phone or os.environ.get("CALLER_PHONE")
+        phone = caller_phone or call_context.CALLER_PHONE.get()
         if not phone:
             raise ValueError("Cannot identify active call - caller phone not available.")
 
         # Store the transfer request in a global transfer_requests dict
-        # The websocket handler will pick this up and execute the transfer
-        from main import transfer_requests
+        # and wake the websocket handler so it executes the transfer
+        from main import transfer_requests, transfer_events
 
         call_key = f"{target_client_id}:{phone}"
         transfer_requests[call_key] = {
@@ -498,6 +499,10 @@ async def handle_transfer_call(
             "timestamp": datetime.now().isoformat()
         }
 
+        transfer_event = transfer_events.get(call_key)
+        if transfer_event:
+            transfer_event.set()
+
         logger.info(f"Transfer request registered for {call_key} -> {transfer_number}")
 
         # Return success to the LLM
@@ -1,9 +1,15 @@
 import httpx
+import time
 from services.supabase_client import get_supabase_client
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Model prices only move when sync_openrouter_prices runs, yet billing
+# looks them up at every call end — cache per model with a short TTL
+PRICE_TTL_SECONDS = 60.0
+_price_cache = {}  # model_id -> (expires_at, price dict)
+
 SUPPORTED_MODELS = [
     "openai/gpt-4o-mini",
     "anthropic/claude-3-haiku",
@@ -53,6 +59,7 @@ async def sync_openrouter_prices():
     #     logger.warning(f"Could not clean up old models: {e}")
 
     result = supabase.table("model_prices").upsert(records).execute()
+    _price_cache.clear()
     logger.info(f"Synced {len(records)} model prices")
     return result
 
@@ -61,7 +68,13 @@ async def get_model_price(model_id):
     """
     Retrieves pricing information for a specific model from the database.
     Returns a dict with input, output, per_request, image prices or None if not found.
+    Hits are cached briefly; sync_openrouter_prices invalidates on write.
     """
+    now = time.monotonic()
+    hit = _price_cache.get(model_id)
+    if hit is not None and hit[0] > now:
+        return hit[1]
+
     supabase = get_supabase_client()
     if not supabase:
         logger.error("Failed to get Supabase client")
@@ -71,10 +84,12 @@ async def get_model_price(model_id):
     if result.data and len(result.data) > 0:
         row = result.data[0]
         if isinstance(row, dict):
-            return {
+            price = {
                 "input": row.get("input_price", 0),
                 "output": row.get("output_price", 0),
                 "per_request": row.get("per_request_price", 0),
                 "image": row.get("image_price", 0),
             }
+            _price_cache[model_id] = (now + PRICE_TTL_SECONDS, price)
+            return price
     return None
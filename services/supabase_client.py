@@ -1,20 +1,38 @@
 import os
+import asyncio
 import logging
+from types import SimpleNamespace
 import jwt
 from typing import Any, Optional, Dict
+import httpx
 from supabase import create_client as sb_create_client, Client
 from supabase.lib.client_options import ClientOptions
 from postgrest.exceptions import APIError
 
+# Optional: used to serialize large transcript payloads off the event loop
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# Process-wide client reused across calls so the underlying HTTP
+# connection pool (TCP + TLS handshakes) amortizes across requests.
+_service_client: Optional[Client] = None
+
 
 def get_supabase_client() -> Optional[Client]:
     """
     Initializes and returns a Supabase client.
     Prioritizes SUPABASE_SERVICE_ROLE_KEY (Admin) if available.
     Falls back to SUPABASE_ANON_KEY (Public) with limited permissions.
+    The client is created once and reused for the life of the process.
     """
+    global _service_client
+    if _service_client is not None:
+        return _service_client
+
     supabase_url: str = os.environ.get("SUPABASE_URL")
 
     # Try Service Role Key first (Bypasses RLS - for Backend use)
@@ -29,7 +47,8 @@ def get_supabase_client() -> Optional[Client]:
         return None
 
     try:
-        return sb_create_client(supabase_url, supabase_key)
+        _service_client = sb_create_client(supabase_url, supabase_key)
+        return _service_client
     except Exception as e:
         logger.error(f"Failed to create Supabase client: {e}")
         return None
@@ -132,6 +151,72 @@ async def get_client_config(client_id: str) -> Optional[Dict[str, Any]]:
         return None
 
 
+# Shared REST client for pre-serialized inserts, created lazily on the
+# running event loop and reused across calls. Keep-alive bounds the pool
+# and HTTP/2 multiplexes concurrent inserts (contact + transcript +
+# ledger writes at call teardown) over one TLS connection.
+_rest_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_rest_client() -> httpx.AsyncClient:
+    global _rest_client
+    if _rest_client is None:
+        try:
+            _rest_client = httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+                timeout=10.0,
+            )
+        except ImportError:
+            # h2 not installed; HTTP/1.1 keep-alive still pools connections
+            _rest_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+                timeout=10.0,
+            )
+    return _rest_client
+
+
+async def close_rest_client():
+    """Close the pooled REST client; called from app shutdown."""
+    global _rest_client
+    if _rest_client is not None:
+        await _rest_client.aclose()
+        _rest_client = None
+
+
+async def _insert_preserialized(table: str, record: Dict[str, Any]):
+    """
+    Inserts a record by POSTing pre-serialized bytes straight to PostgREST.
+
+    Large payloads (call transcripts) are encoded with orjson in a worker
+    thread so the event loop isn't blocked by the encode, and the bytes go
+    out once instead of being re-encoded inside the supabase-py stack.
+    Returns an object with a .data attribute like supabase-py, or None if
+    orjson or credentials are unavailable so callers can fall back.
+    """
+    supabase_url = os.environ.get("SUPABASE_URL")
+    supabase_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY") or os.environ.get(
+        "SUPABASE_ANON_KEY"
+    )
+    if orjson is None or not supabase_url or not supabase_key:
+        return None
+
+    payload = await asyncio.to_thread(orjson.dumps, record, default=str)
+
+    response = await _get_rest_client().post(
+        f"{supabase_url}/rest/v1/{table}",
+        content=payload,
+        headers={
+            "apikey": supabase_key,
+            "Authorization": f"Bearer {supabase_key}",
+            "Content-Type": "application/json",
+            "Prefer": "return=representation",
+        },
+    )
+    response.raise_for_status()
+    return SimpleNamespace(data=response.json())
+
+
 async def log_conversation(
     contact_id: str,
     client_id: str,
@@ -141,12 +226,9 @@ async def log_conversation(
 ):
     """
     Logs the conversation details to the 'conversations' table.
+    The transcript can be tens of KB, so the insert is serialized in a
+    thread and POSTed directly when possible.
     """
-    supabase = get_supabase_client()
-    if not supabase:
-        logger.error("Failed to log conversation, Supabase client not available.")
-        return
-
     data_to_insert = {
         "contact_id": contact_id,
         "client_id": client_id,
@@ -157,6 +239,19 @@ async def log_conversation(
     if duration is not None:
         data_to_insert["duration"] = duration
 
+    try:
+        response = await _insert_preserialized("conversations", data_to_insert)
+        if response is not None:
+            logger.info(f"Conversation logged successfully for contact_id {contact_id}.")
+            return response
+    except Exception as e:
+        logger.warning(f"Direct conversation insert failed, falling back: {e}")
+
+    supabase = get_supabase_client()
+    if not supabase:
+        logger.error("Failed to log conversation, Supabase client not available.")
+        return
+
     try:
         response = (
             supabase.table("conversations")
@@ -171,6 +266,40 @@ async def log_conversation(
         logger.error(f"Unexpected error logging conversation: {e}")
 
 
+async def finalize_call_record(
+    client_id: str,
+    contact_id: Optional[str],
+    transcript: Any,
+    duration: int,
+    ledger_rows: list,
+) -> Optional[str]:
+    """
+    Writes a finished call's conversation row and ledger breakdown in one
+    transaction via the finalize_call RPC (see schema.sql). Returns the
+    new conversation id, or None if the RPC is unavailable so callers can
+    fall back to separate inserts.
+    """
+    supabase = get_supabase_client()
+    if not supabase:
+        return None
+
+    try:
+        response = supabase.rpc(
+            "finalize_call",
+            {
+                "p_client_id": client_id,
+                "p_contact_id": contact_id,
+                "p_transcript": transcript,
+                "p_duration": duration,
+                "p_metrics": ledger_rows,
+            },
+        ).execute()
+        return response.data
+    except Exception as e:
+        logger.warning(f"finalize_call RPC unavailable ({e}), falling back to separate writes")
+        return None
+
+
 async def update_contact_name(phone_number: str, name: str, client_id: str) -> bool:
     """
     Updates the name of a contact identified by phone AND client_id.
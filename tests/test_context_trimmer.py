@@ -0,0 +1,57 @@
+from services.context_trimmer import trim_messages
+
+
+def _turns(n):
+    messages = []
+    for i in range(n):
+        messages.append({"role": "user", "content": f"user {i}"})
+        messages.append({"role": "assistant", "content": f"assistant {i}"})
+    return messages
+
+
+def test_short_history_untouched():
+    messages = [{"role": "system", "content": "prompt"}] + _turns(3)
+    assert trim_messages(messages) is messages
+
+
+def test_stale_tool_exchange_dropped_but_text_kept():
+    tool_exchange = [
+        {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{"id": "call_1", "function": {"name": "check_availability"}}],
+        },
+        {"role": "tool", "content": "{...large availability payload...}", "tool_call_id": "call_1"},
+    ]
+    messages = (
+        [{"role": "system", "content": "prompt"}, {"role": "system", "content": "date"}]
+        + _turns(2)
+        + tool_exchange
+        + _turns(10)
+    )
+
+    trimmed = trim_messages(messages, keep_recent=8)
+
+    roles = [m["role"] for m in trimmed]
+    assert "tool" not in roles
+    assert not any(m.get("tool_calls") for m in trimmed)
+    # Cacheable prefix and all spoken turns survive
+    assert trimmed[:2] == messages[:2]
+    assert [m for m in trimmed if m["role"] in ("user", "assistant")] == _turns(2) + _turns(10)
+
+
+def test_recent_tool_exchange_kept_intact():
+    tool_exchange = [
+        {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{"id": "call_2", "function": {"name": "book_appointment"}}],
+        },
+        {"role": "tool", "content": "booked", "tool_call_id": "call_2"},
+    ]
+    messages = [{"role": "system", "content": "prompt"}] + _turns(8) + tool_exchange
+
+    trimmed = trim_messages(messages, keep_recent=8)
+
+    # The exchange falls inside the verbatim tail and must not be split
+    assert trimmed[-2:] == tool_exchange